@@ -0,0 +1,60 @@
+"""Environment configuration for the auth service.
+
+Every setting is read and parsed once at import time, so request handlers
+use plain module attributes instead of os.environ lookups and string
+parsing per call. Import the module (``from . import envs``) and read
+``envs.NAME`` rather than copying values with ``from .envs import NAME``.
+"""
+import os
+from typing import Optional
+
+
+def _truthy(value: Optional[str]) -> bool:
+    """Interpret common env-var spellings of true."""
+    return (value or "").strip().lower() in ("1", "true", "yes", "on")
+
+
+# Database
+DATABASE_URL: Optional[str] = os.environ.get("DATABASE_URL") or None
+DB_POOL_MIN_SIZE: int = int(os.environ.get("DB_POOL_MIN_SIZE", "2"))
+DB_POOL_MAX_SIZE: int = int(os.environ.get("DB_POOL_MAX_SIZE", "10"))
+DB_ASYNC_POOL_MIN_SIZE: int = int(os.environ.get("DB_ASYNC_POOL_MIN_SIZE", "1"))
+DB_ASYNC_POOL_MAX_SIZE: int = int(os.environ.get("DB_ASYNC_POOL_MAX_SIZE", "8"))
+# How long startup migrations keep retrying the initial connection
+MIGRATIONS_CONNECT_TIMEOUT: float = float(os.environ.get("MIGRATIONS_CONNECT_TIMEOUT", "60"))
+
+# Uvicorn server
+WEB_CONCURRENCY: int = int(os.environ.get("WEB_CONCURRENCY", "1"))
+ACCESS_LOG: bool = _truthy(os.environ.get("ACCESS_LOG"))
+# Uvicorn log level (critical/error/warning/info/debug/trace)
+LOG_LEVEL: str = os.environ.get("LOG_LEVEL", "info").strip().lower()
+# Worker threads for sync (def) endpoints and dependencies (anyio default is 40)
+THREADPOOL_SIZE: int = int(os.environ.get("THREADPOOL_SIZE", "100"))
+
+# Health / egress probes
+HEALTH_CACHE_TTL_SECONDS: float = float(os.environ.get("HEALTH_CACHE_TTL_SECONDS", "3"))
+EXTERNAL_PING_URL: str = os.environ.get("EXTERNAL_PING_URL", "https://example.com")
+EGRESS_MAX_CONCURRENCY: int = int(os.environ.get("EGRESS_MAX_CONCURRENCY", "16"))
+
+# Admin bootstrap token (legacy X-Admin-Token header)
+ADMIN_TOKEN: Optional[str] = os.environ.get("ADMIN_TOKEN") or None
+
+# Shared secret for internal service-to-service calls (X-Service-Token header)
+SERVICE_SECRET: Optional[str] = os.environ.get("SERVICE_SECRET") or None
+
+# Key for OTP code digests (falls back to JWT_SECRET when unset)
+OTP_HMAC_KEY: Optional[str] = os.environ.get("OTP_HMAC_KEY") or None
+
+# Redis for OTP rate-limit counters (optional; Postgres is used when unset)
+REDIS_URL: Optional[str] = os.environ.get("REDIS_URL") or None
+
+# OTP and rate limiting
+OTP_EXPIRY_MINUTES: int = int(os.environ.get("OTP_EXPIRY_MINUTES", "5"))
+OTP_MAX_ATTEMPTS: int = int(os.environ.get("OTP_MAX_ATTEMPTS", "8"))
+RATE_LIMIT_WINDOW_MINUTES: int = int(os.environ.get("RATE_LIMIT_WINDOW_MINUTES", "15"))
+RATE_LIMIT_MAX_REQUESTS: int = int(os.environ.get("RATE_LIMIT_MAX_REQUESTS", "3"))
+
+# SMS delivery via Twilio (all three required to enable SMS)
+TWILIO_ACCOUNT_SID: Optional[str] = os.environ.get("TWILIO_ACCOUNT_SID") or None
+TWILIO_AUTH_TOKEN: Optional[str] = os.environ.get("TWILIO_AUTH_TOKEN") or None
+TWILIO_PHONE_NUMBER: Optional[str] = os.environ.get("TWILIO_PHONE_NUMBER") or None
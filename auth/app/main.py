@@ -1,18 +1,32 @@
-import os
+import asyncio
+import anyio.to_thread
+import base64
 from contextlib import asynccontextmanager
-from fastapi import FastAPI, HTTPException, Header
-from pydantic import BaseModel, EmailStr, Field
-from typing import Optional
+from datetime import datetime, timezone
+from fastapi import BackgroundTasks, FastAPI, HTTPException, Header, Depends, Request, Response
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, EmailStr, Field, TypeAdapter, ValidationError
+from typing import Optional, TypeVar
+from typing_extensions import TypedDict
+from uuid import UUID
+import httpx
 import jwt as pyjwt
 
 try:
     import psycopg
+    from psycopg.rows import tuple_row
 except Exception:  # pragma: no cover
     psycopg = None  # Optional import; endpoint will report if missing
 
+from . import envs
 from .services.migrations import run_migrations
+from .services.database import async_pool, open_pool, close_pool
+from .services.http import close_http_client
+from .services.oauth import warm_encryption
 from .services import users, otp, jwt, sms
 from .services import email as email_service
+from .services.cache import TTLCache
 from .routers import oauth, credentials, credentials_oauth
 
 """
@@ -28,14 +42,32 @@ Super users have elevated business privileges but cannot access user management.
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    """Run database migrations on startup."""
+    """Run database migrations on startup and manage the DB connection pool."""
     try:
         run_migrations()
         print("Database migrations completed successfully")
     except Exception as e:
         print(f"Database migration failed: {e}")
         raise
-    yield
+    await open_pool()
+    # Sync endpoints and dependencies (blocking psycopg calls) run on anyio's
+    # worker threads; raise the cap so a burst does not queue behind 40 slots
+    anyio.to_thread.current_default_thread_limiter().total_tokens = envs.THREADPOOL_SIZE
+    # Derive the token encryption key now rather than on the first request
+    await anyio.to_thread.run_sync(warm_encryption)
+    # Kept-alive HTTP/2 client for the egress probe
+    app.state.http = httpx.AsyncClient(
+        http2=True,
+        timeout=3.0,
+        follow_redirects=True,
+        limits=httpx.Limits(max_keepalive_connections=8),
+    )
+    try:
+        yield
+    finally:
+        await app.state.http.aclose()
+        await close_http_client()
+        await close_pool()
 
 
 app = FastAPI(title="Auth Service", version="0.1.0", lifespan=lifespan)
@@ -101,11 +133,6 @@ class ListUsersResponse(BaseModel):
     limit: int
 
 
-class UpdateUserRequest(BaseModel):
-    role: Optional[str] = Field(None, pattern="^(user|admin|super)$")
-    isActive: Optional[bool] = None
-
-
 class UpdateUserResponse(BaseModel):
     success: bool
     message: str
@@ -123,7 +150,7 @@ class UpdateUserRequest(BaseModel):
     email: Optional[str] = None
     phone: Optional[str] = None
     preference: Optional[str] = None
-    role: Optional[str] = None
+    role: Optional[str] = Field(None, pattern="^(user|admin|super)$")
     isActive: Optional[bool] = None
 
 
@@ -132,36 +159,142 @@ class DeleteUserResponse(BaseModel):
     message: str
 
 
+ModelT = TypeVar("ModelT", bound=BaseModel)
+
+
+def json_body(model: type[ModelT]):
+    """Dependency that validates the raw request body with model_validate_json.
+
+    Pydantic parses the JSON bytes directly in its native parser, skipping the
+    intermediate dict FastAPI would otherwise build with json.loads.
+    """
+    async def dependency(request: Request) -> ModelT:
+        try:
+            return model.model_validate_json(await request.body())
+        except ValidationError as e:
+            errors = e.errors(include_url=False)
+            for error in errors:
+                error["loc"] = ("body", *error["loc"])
+            raise RequestValidationError(errors)
+    return Depends(dependency)
+
+
+def json_body_schema(model: type[BaseModel]) -> dict:
+    """OpenAPI requestBody for endpoints that take their body via json_body()."""
+    return {
+        "requestBody": {
+            "required": True,
+            "content": {"application/json": {"schema": model.model_json_schema()}},
+        }
+    }
+
+
+# Serializes a page of profiles in one pass instead of validating a ListUsersResponse
+_profile_list_adapter = TypeAdapter(list[UserProfile])
+
+
+def _user_profile(user_dict: dict) -> UserProfile:
+    """Build a UserProfile from User.to_dict() output.
+
+    Uses model_construct since the data comes straight from the database and
+    needs no re-validation.
+    """
+    return UserProfile.model_construct(
+        id=user_dict["id"],
+        email=user_dict["email"],
+        phone=user_dict.get("phone"),
+        otpPreference=user_dict.get("otp_preference"),
+        role=user_dict["role"],
+        isActive=user_dict["is_active"],
+        verifiedAt=user_dict.get("verified_at"),
+        createdAt=user_dict.get("created_at"),
+        lastLoginAt=user_dict.get("last_login_at")
+    )
+
+
+# Static errors raised on hot rejection paths (rate limiting, bad/missing
+# credentials) are built once. Raise them via .with_traceback(None) so a
+# reused instance does not keep growing its traceback.
+_ERR_RATE_LIMITED = HTTPException(status_code=429, detail="Too many OTP requests. Please try again later.")
+_ERR_USER_NOT_FOUND = HTTPException(status_code=404, detail="User not found")
+_ERR_AUTH_REQUIRED = HTTPException(status_code=401, detail="Authorization header required")
+_ERR_BAD_AUTH_HEADER = HTTPException(status_code=401, detail="Invalid authorization header format")
+_ERR_BAD_TOKEN_PAYLOAD = HTTPException(status_code=401, detail="Invalid token payload")
+_ERR_TOKEN_EXPIRED = HTTPException(status_code=401, detail="Token has expired")
+_ERR_INVALID_TOKEN = HTTPException(status_code=401, detail="Invalid token")
+_ERR_ADMIN_REQUIRED = HTTPException(status_code=403, detail="Admin access required")
+
+
 @app.get("/auth/health")
 def health():
     """Minimal liveness endpoint for internal checks."""
     return {"status": "ok"}
 
 
+# Successful probe results are reused for a few seconds so that frequent
+# liveness/readiness polling does not open a new connection on every call.
+_health_cache = TTLCache(maxsize=16, ttl=envs.HEALTH_CACHE_TTL_SECONDS)
+
+# version()/current_database()/current_user do not change while the server is
+# up, so db_health refreshes them only every few probes and otherwise runs SELECT 1.
+_db_meta_cache = TTLCache(maxsize=4, ttl=10)
+
+
 @app.get("/auth/db/health")
-def db_health():
+async def db_health():
     """Lightweight DB connectivity check using DATABASE_URL.
 
     Returns:
         { status: "ok" | "skipped" | "error", details?: str }
     """
-    dsn = os.environ.get("DATABASE_URL")
+    dsn = envs.DATABASE_URL
     if not dsn:
         return {"status": "skipped", "details": "DATABASE_URL not set"}
     if psycopg is None:
         raise HTTPException(status_code=500, detail="psycopg not installed in image")
+    cached = _health_cache.get(("db", dsn))
+    if cached is not None:
+        return cached
     try:
-        with psycopg.connect(dsn, connect_timeout=3) as conn:
-            with conn.cursor() as cur:
-                cur.execute("SELECT version(), current_database(), current_user")
-                version, dbname, user = cur.fetchone()
-        return {"status": "ok", "database": dbname, "user": user, "version": str(version)}
+        result = _db_meta_cache.get(dsn)
+        async with async_pool.connection(timeout=3) as conn:
+            async with conn.cursor(row_factory=tuple_row) as cur:
+                if result is not None:
+                    # Server metadata is still fresh; only prove liveness
+                    await cur.execute("SELECT 1")
+                    await cur.fetchone()
+                else:
+                    await cur.execute("SELECT version(), current_database(), current_user")
+                    version, dbname, user = await cur.fetchone()
+                    result = {"status": "ok", "database": dbname, "user": user, "version": str(version)}
+                    _db_meta_cache.set(dsn, result)
+        _health_cache.set(("db", dsn), result)
+        return result
     except Exception as e:  # pragma: no cover
         raise HTTPException(status_code=500, detail=f"DB check failed: {e}")
 
 
+# Outbound probes are bounded: concurrent probes of the same target share a
+# single outbound request, and past envs.EGRESS_MAX_CONCURRENCY distinct in-flight
+# targets the endpoint answers 503 at once instead of queueing.
+_egress_inflight: dict[str, asyncio.Future] = {}
+
+
+async def _probe_egress(target: str) -> dict:
+    """Issue one outbound check against target and cache a successful result."""
+    # HEAD avoids downloading the body; fall back to GET for servers
+    # that do not allow it
+    resp = await app.state.http.head(target)
+    if resp.status_code == 405:
+        resp = await app.state.http.get(target)
+    resp.raise_for_status()
+    result = {"status": "ok", "url": target, "code": resp.status_code}
+    _health_cache.set(("egress", target), result)
+    return result
+
+
 @app.get("/auth/egress/health")
-def egress_health(url: str | None = None):
+async def egress_health(url: str | None = None):
     """Simple outbound HTTP check.
 
     Args:
@@ -171,94 +304,142 @@ def egress_health(url: str | None = None):
     Returns:
         JSON with status ok and the HTTP status code from the target on success.
     """
-    target = url or os.environ.get("EXTERNAL_PING_URL", "https://example.com")
+    target = url or envs.EXTERNAL_PING_URL
+    cached = _health_cache.get(("egress", target))
+    if cached is not None:
+        return cached
+    probe = _egress_inflight.get(target)
+    if probe is None:
+        if len(_egress_inflight) >= envs.EGRESS_MAX_CONCURRENCY:
+            raise HTTPException(status_code=503, detail="Egress check busy, retry later")
+        probe = asyncio.ensure_future(_probe_egress(target))
+        _egress_inflight[target] = probe
+        probe.add_done_callback(lambda _: _egress_inflight.pop(target, None))
     try:
-        import urllib.request
-
-        with urllib.request.urlopen(target, timeout=3) as resp:  # nosec B310
-            code = resp.getcode()
-            return {"status": "ok", "url": target, "code": int(code)}
+        # shield: a disconnecting caller must not cancel a probe others await
+        return await asyncio.shield(probe)
     except Exception as e:  # pragma: no cover
         raise HTTPException(status_code=500, detail=f"Egress failed: {e}")
 
 
+def _encode_versions_cursor(applied_at, row_id: int) -> str:
+    """Opaque keyset cursor for /auth/versions: base64 of "applied_at|id"."""
+    raw = f"{applied_at.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode_versions_cursor(cursor: str) -> tuple[datetime, int]:
+    """Inverse of _encode_versions_cursor; raises 400 on a malformed cursor."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        applied_at, row_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(applied_at), int(row_id)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+# History page plus the registry pointer as a fallback, in one round trip.
+# The pointer row is only returned on the first page and only when there is
+# no history yet. The first page passes a cursor above every real row so the
+# statement (and its prepared plan) is the same for every page.
+VERSIONS_SQL = """
+    WITH h AS (
+        SELECT service, semver, ts_key, applied_at, id
+        FROM auth.schema_registry_history
+        WHERE service = 'auth' AND (applied_at, id) < (%(after_at)s, %(after_id)s)
+        ORDER BY applied_at DESC, id DESC
+        LIMIT %(limit)s
+    )
+    SELECT service, semver, ts_key, applied_at, id FROM h
+    UNION ALL
+    SELECT service, semver, ts_key, applied_at, NULL
+    FROM auth.schema_registry
+    WHERE service = 'auth' AND %(first_page)s AND NOT EXISTS (SELECT 1 FROM h)
+"""
+
+_VERSIONS_FIRST_PAGE = (datetime.max.replace(tzinfo=timezone.utc), 2**63 - 1)
+
+
+class VersionEntry(TypedDict):
+    service: str
+    semver: str
+    ts_key: Optional[int]
+    applied_at: Optional[datetime]
+
+
+_versions_adapter = TypeAdapter(list[VersionEntry])
+
+
 @app.get("/auth/versions")
-def versions(n: int = 5):
+async def versions(n: int = 5, cursor: Optional[str] = None):
     """Return the last n applied schema versions for the auth service (newest first).
 
-    If the history table is not present yet, falls back to the single current entry
+    Pages with a keyset cursor: when more history may follow, the X-Next-Cursor
+    response header carries a cursor to pass back as ?cursor= for the next page.
+
+    If there is no history yet, falls back to the single current entry
     from auth.schema_registry (if available).
     """
-    dsn = os.environ.get("DATABASE_URL")
+    dsn = envs.DATABASE_URL
     if not dsn:
         return []
     if psycopg is None:
         raise HTTPException(status_code=500, detail="psycopg not installed in image")
 
+    limit = max(1, min(n, 100))
+    after_at, after_id = _decode_versions_cursor(cursor) if cursor else _VERSIONS_FIRST_PAGE
+
     try:
-        with psycopg.connect(dsn, connect_timeout=3, autocommit=True) as conn:
-            with conn.cursor() as cur:
-                # Try history first
-                try:
-                    cur.execute(
-                        (
-                            "SELECT service, semver, ts_key, applied_at "
-                            "FROM auth.schema_registry_history WHERE service='auth' "
-                            "ORDER BY applied_at DESC LIMIT %s"
-                        ),
-                        (max(1, min(n, 100)),),
-                    )
-                    rows = cur.fetchall()
-                except Exception:
-                    # If the first query fails (e.g., history table missing), reset state and fallback
-                    try:
-                        conn.rollback()
-                    except Exception:
-                        pass
-                    rows = []
-
-                if not rows:
-                    # Fallback to single pointer row
-                    try:
-                        cur.execute(
-                            "SELECT service, semver, ts_key, applied_at FROM auth.schema_registry WHERE service='auth'"
-                        )
-                        one = cur.fetchone()
-                        if one:
-                            rows = [one]
-                    except Exception:
-                        # Neither history nor pointer exists yet
-                        rows = []
-        return [
-            {
-                "service": r[0],
-                "semver": r[1],
-                "ts_key": int(r[2]) if r[2] is not None else None,
-                "applied_at": (r[3].isoformat() if hasattr(r[3], "isoformat") else str(r[3])) if r[3] is not None else None,
-            }
-            for r in rows
-        ]
+        # Pool connections use dict rows; the statement is prepared so each
+        # pooled backend plans it once
+        async with async_pool.connection(timeout=3) as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    VERSIONS_SQL,
+                    {
+                        "after_at": after_at,
+                        "after_id": after_id,
+                        "limit": limit,
+                        "first_page": cursor is None,
+                    },
+                    prepare=True,
+                )
+                rows = await cur.fetchall()
+        # Rows go straight to pydantic-core for serialization; the TypedDict
+        # drops the cursor-only id column
+        resp = Response(_versions_adapter.dump_json(rows), media_type="application/json")
+        if len(rows) == limit and rows[-1]["id"] is not None:
+            resp.headers["X-Next-Cursor"] = _encode_versions_cursor(rows[-1]["applied_at"], rows[-1]["id"])
+        return resp
     except Exception as e:  # pragma: no cover
         raise HTTPException(status_code=500, detail=f"Version lookup failed: {e}")
 
 
 # OTP Authentication Endpoints
 
-@app.post("/auth/request-otp", response_model=RequestOtpResponse)
-def request_otp(request: RequestOtpRequest):
+def _deliver_otp_sms(phone: str, otp_code: str, challenge_id: UUID) -> None:
+    """Send an OTP by SMS (background task); cancel the challenge on failure."""
+    if not sms.send_otp_sms(phone, otp_code):
+        otp.cancel_otp(challenge_id)
+
+
+@app.post("/auth/request-otp", response_model=RequestOtpResponse,
+          openapi_extra=json_body_schema(RequestOtpRequest))
+def request_otp(background_tasks: BackgroundTasks,
+                request: RequestOtpRequest = json_body(RequestOtpRequest)):
     """Request OTP for email-based authentication.
     
     For new users: requires phone and preference (sms or email)
     For existing users: uses saved phone and preference
+    
+    SMS codes are handed to Twilio after the response is sent; if delivery
+    fails the challenge is canceled and the user can request a new code.
     """
-    email_addr = request.email.lower()
+    email_addr = users.normalize_email(request.email)
     
     # Check rate limiting
     if otp.check_rate_limit(email_addr):
-        raise HTTPException(
-            status_code=429,
-            detail="Too many OTP requests. Please try again later."
-        )
+        raise _ERR_RATE_LIMITED.with_traceback(None)
     
     # Check if user exists
     user = users.find_user_by_email(email_addr)
@@ -285,8 +466,8 @@ def request_otp(request: RequestOtpRequest):
         )
     
     # Generate and store OTP
-    otp_code = otp.generate_otp()
-    otp.store_otp(user.id, otp_code)
+    challenge_id, otp_code = otp.generate_challenge()
+    otp.store_otp(user.id, otp_code, challenge_id=challenge_id)
     
     # Send OTP based on preference
     preference = user.otp_preference
@@ -298,11 +479,7 @@ def request_otp(request: RequestOtpRequest):
                     status_code=500,
                     detail="SMS delivery not configured"
                 )
-            if not sms.send_otp_sms(user.phone, otp_code):
-                raise HTTPException(
-                    status_code=500,
-                    detail="Failed to send SMS"
-                )
+            background_tasks.add_task(_deliver_otp_sms, user.phone, otp_code, challenge_id)
         else:  # email
             if not email_service.is_smtp_configured():
                 raise HTTPException(
@@ -327,15 +504,16 @@ def request_otp(request: RequestOtpRequest):
     )
 
 
-@app.post("/auth/verify-otp", response_model=VerifyOtpResponse)
-def verify_otp_endpoint(request: VerifyOtpRequest):
+@app.post("/auth/verify-otp", response_model=VerifyOtpResponse,
+          openapi_extra=json_body_schema(VerifyOtpRequest))
+def verify_otp_endpoint(request: VerifyOtpRequest = json_body(VerifyOtpRequest)):
     """Verify OTP and issue JWT token."""
-    email_addr = request.email.lower()
+    email_addr = users.normalize_email(request.email)
     
     # Get user
     user = users.find_user_by_email(email_addr)
     if not user:
-        raise HTTPException(status_code=404, detail="User not found")
+        raise _ERR_USER_NOT_FOUND.with_traceback(None)
     
     # Validate OTP
     success, error_msg = otp.validate_otp(user.id, request.otp)
@@ -344,9 +522,7 @@ def verify_otp_endpoint(request: VerifyOtpRequest):
         raise HTTPException(status_code=400, detail=error_msg)
     
     # Update last login and verify user if not already verified
-    users.update_last_login(email_addr)
-    if not user.verified_at:
-        users.verify_user(email_addr)
+    users.record_login(email_addr)
     
     # Generate JWT
     token = jwt.generate_jwt(str(user.id), user.email, user.role)
@@ -356,60 +532,49 @@ def verify_otp_endpoint(request: VerifyOtpRequest):
     return VerifyOtpResponse(
         success=True,
         token=token,
-        user=UserProfile(
-            id=user_dict["id"],
-            email=user_dict["email"],
-            phone=user_dict.get("phone"),
-            otpPreference=user_dict.get("otp_preference"),
-            role=user_dict["role"],
-            isActive=user_dict["is_active"],
-            verifiedAt=user_dict.get("verified_at"),
-            createdAt=user_dict.get("created_at"),
-            lastLoginAt=user_dict.get("last_login_at")
-        )
+        user=_user_profile(user_dict)
     )
 
 
+def _extract_bearer(authorization: Optional[str]) -> str:
+    """Return the token from a "Bearer <token>" header.
+    
+    Only the 7-character scheme prefix is inspected and lowercased; the token
+    itself is sliced off without splitting the whole header.
+    """
+    if not authorization:
+        raise _ERR_AUTH_REQUIRED.with_traceback(None)
+    if len(authorization) < 8 or authorization[:7].lower() != "bearer ":
+        raise _ERR_BAD_AUTH_HEADER.with_traceback(None)
+    token = authorization[7:].strip()
+    if not token or " " in token:
+        raise _ERR_BAD_AUTH_HEADER.with_traceback(None)
+    return token
+
+
 @app.get("/auth/me", response_model=UserProfile)
 def get_current_user(authorization: Optional[str] = Header(None)):
     """Get current user profile from JWT token."""
-    if not authorization:
-        raise HTTPException(status_code=401, detail="Authorization header required")
-    
-    # Extract token from "Bearer <token>"
-    parts = authorization.split()
-    if len(parts) != 2 or parts[0].lower() != "bearer":
-        raise HTTPException(status_code=401, detail="Invalid authorization header format")
-    
-    token = parts[1]
+    token = _extract_bearer(authorization)
     
     try:
+        jwt.check_token_header(token)
         payload = jwt.verify_jwt(token)
         email_addr = payload.get("email")
         
         if not email_addr:
-            raise HTTPException(status_code=401, detail="Invalid token payload")
+            raise _ERR_BAD_TOKEN_PAYLOAD.with_traceback(None)
         
-        user = users.find_user_by_email(email_addr)
+        # Issued from the stored (already normalized) address
+        user = users.find_user_by_email(users.Email(email_addr))
         if not user:
-            raise HTTPException(status_code=404, detail="User not found")
+            raise _ERR_USER_NOT_FOUND.with_traceback(None)
         
-        user_dict = user.to_dict()
-        return UserProfile(
-            id=user_dict["id"],
-            email=user_dict["email"],
-            phone=user_dict.get("phone"),
-            otpPreference=user_dict.get("otp_preference"),
-            role=user_dict["role"],
-            isActive=user_dict["is_active"],
-            verifiedAt=user_dict.get("verified_at"),
-            createdAt=user_dict.get("created_at"),
-            lastLoginAt=user_dict.get("last_login_at")
-        )
+        return _user_profile(user.to_dict())
     except pyjwt.ExpiredSignatureError:
-        raise HTTPException(status_code=401, detail="Token has expired")
+        raise _ERR_TOKEN_EXPIRED.with_traceback(None)
     except pyjwt.InvalidTokenError:
-        raise HTTPException(status_code=401, detail="Invalid token")
+        raise _ERR_INVALID_TOKEN.with_traceback(None)
 
 
 # Admin Endpoints
@@ -424,33 +589,53 @@ def verify_admin_jwt(authorization: Optional[str]) -> dict:
         HTTPException: 401 if token is missing/invalid/expired
         HTTPException: 403 if user role is not 'admin'
     """
-    if not authorization:
-        raise HTTPException(status_code=401, detail="Authorization header required")
-    
-    parts = authorization.split()
-    if len(parts) != 2 or parts[0].lower() != "bearer":
-        raise HTTPException(status_code=401, detail="Invalid authorization header format")
-    
-    token = parts[1]
+    token = _extract_bearer(authorization)
     
     try:
+        jwt.check_token_header(token)
         payload = jwt.verify_jwt(token)
         role = payload.get("role")
         
         # Only 'admin' role can access admin console
         if role != "admin":
-            raise HTTPException(status_code=403, detail="Admin access required")
+            raise _ERR_ADMIN_REQUIRED.with_traceback(None)
         
         return payload
     except pyjwt.ExpiredSignatureError:
-        raise HTTPException(status_code=401, detail="Token has expired")
+        raise _ERR_TOKEN_EXPIRED.with_traceback(None)
     except pyjwt.InvalidTokenError:
-        raise HTTPException(status_code=401, detail="Invalid token")
+        raise _ERR_INVALID_TOKEN.with_traceback(None)
 
 
-@app.post("/auth/admin/create-user", response_model=CreateUserResponse)
+def _create_user(request: CreateUserRequest) -> CreateUserResponse:
+    """Shared body of the admin create-user endpoints (caller has authorized)."""
+    email_addr = users.normalize_email(request.email)
+    
+    # Check if user already exists
+    existing_user = users.find_user_by_email(email_addr)
+    if existing_user:
+        raise HTTPException(
+            status_code=409,
+            detail=f"User with email {email_addr} already exists"
+        )
+    
+    # Create user
+    try:
+        user = users.create_user(email_addr, request.phone, request.preference, request.role)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return CreateUserResponse(
+        success=True,
+        message=f"User {email_addr} created successfully",
+        user=_user_profile(user.to_dict())
+    )
+
+
+@app.post("/auth/admin/create-user", response_model=CreateUserResponse,
+          openapi_extra=json_body_schema(CreateUserRequest))
 def create_user_admin(
-    request: CreateUserRequest,
+    request: CreateUserRequest = json_body(CreateUserRequest),
     authorization: Optional[str] = Header(None),
     x_admin_token: Optional[str] = Header(None)
 ):
@@ -465,7 +650,7 @@ def create_user_admin(
         verify_admin_jwt(authorization)
     elif x_admin_token:
         # Fallback to legacy X-Admin-Token for bootstrapping
-        admin_token = os.environ.get("ADMIN_TOKEN")
+        admin_token = envs.ADMIN_TOKEN
         if not admin_token:
             raise HTTPException(
                 status_code=500,
@@ -483,38 +668,7 @@ def create_user_admin(
             detail="Authorization required (Bearer token or X-Admin-Token)"
         )
     
-    email_addr = request.email.lower()
-    
-    # Check if user already exists
-    existing_user = users.find_user_by_email(email_addr)
-    if existing_user:
-        raise HTTPException(
-            status_code=409,
-            detail=f"User with email {email_addr} already exists"
-        )
-    
-    # Create user
-    try:
-        user = users.create_user(email_addr, request.phone, request.preference, request.role)
-    except ValueError as e:
-        raise HTTPException(status_code=400, detail=str(e))
-    
-    user_dict = user.to_dict()
-    return CreateUserResponse(
-        success=True,
-        message=f"User {email_addr} created successfully",
-        user=UserProfile(
-            id=user_dict["id"],
-            email=user_dict["email"],
-            phone=user_dict.get("phone"),
-            otpPreference=user_dict.get("otp_preference"),
-            role=user_dict["role"],
-            isActive=user_dict["is_active"],
-            verifiedAt=user_dict.get("verified_at"),
-            createdAt=user_dict.get("created_at"),
-            lastLoginAt=user_dict.get("last_login_at")
-        )
-    )
+    return _create_user(request)
 
 
 @app.get("/auth/admin/users", response_model=ListUsersResponse)
@@ -541,88 +695,35 @@ def list_users_admin(
     # Get all users (simplified - no search yet)
     all_users = users.list_all_users()
     
-    # Apply search filter if provided
+    # Apply search filter if provided, converting each user to a dict once
+    # and reusing it for the page below
     if search:
         search_lower = search.lower()
-        all_users = [
-            u for u in all_users
-            if search_lower in u.to_dict()["email"].lower()
-            or (u.to_dict().get("phone") and search_lower in u.to_dict()["phone"])
-        ]
-    
-    total = len(all_users)
-    paginated_users = all_users[offset:offset + limit]
-    
-    user_profiles = []
-    for user in paginated_users:
-        user_dict = user.to_dict()
-        user_profiles.append(UserProfile(
-            id=user_dict["id"],
-            email=user_dict["email"],
-            phone=user_dict.get("phone"),
-            otpPreference=user_dict.get("otp_preference"),
-            role=user_dict["role"],
-            isActive=user_dict["is_active"],
-            verifiedAt=user_dict.get("verified_at"),
-            createdAt=user_dict.get("created_at"),
-            lastLoginAt=user_dict.get("last_login_at")
-        ))
-    
-    return ListUsersResponse(
-        users=user_profiles,
-        total=total,
-        page=page,
-        limit=limit
-    )
-
-
-@app.patch("/auth/admin/users/{user_id}", response_model=UpdateUserResponse)
-def update_user_admin(
-    user_id: str,
-    request: UpdateUserRequest,
-    authorization: Optional[str] = Header(None)
-):
-    """Admin endpoint to update user role or status.
-    
-    Requires JWT Bearer token with admin/super role.
-    """
-    verify_admin_jwt(authorization)
-    
-    # Find user
-    user = users.find_user_by_id(user_id)
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
+        user_dicts = []
+        for u in all_users:
+            d = u.to_dict()
+            if search_lower in d["email"].lower() or search_lower in (d.get("phone") or ""):
+                user_dicts.append(d)
+        page_dicts = user_dicts[offset:offset + limit]
+        total = len(user_dicts)
+    else:
+        page_dicts = [u.to_dict() for u in all_users[offset:offset + limit]]
+        total = len(all_users)
     
-    # Update user fields
-    try:
-        if request.role is not None:
-            user = users.update_user_role(user_id, request.role)
-        if request.isActive is not None:
-            user = users.update_user_status(user_id, request.isActive)
-    except ValueError as e:
-        raise HTTPException(status_code=400, detail=str(e))
+    user_profiles = [_user_profile(d) for d in page_dicts]
     
-    user_dict = user.to_dict()
-    return UpdateUserResponse(
-        success=True,
-        message=f"User {user_dict['email']} updated successfully",
-        user=UserProfile(
-            id=user_dict["id"],
-            email=user_dict["email"],
-            phone=user_dict.get("phone"),
-            otpPreference=user_dict.get("otp_preference"),
-            role=user_dict["role"],
-            isActive=user_dict["is_active"],
-            verifiedAt=user_dict.get("verified_at"),
-            createdAt=user_dict.get("created_at"),
-            lastLoginAt=user_dict.get("last_login_at")
-        )
-    )
+    return JSONResponse({
+        "users": _profile_list_adapter.dump_python(user_profiles, mode="json"),
+        "total": total,
+        "page": page,
+        "limit": limit
+    })
 
 
-@app.post("/auth/admin/users", response_model=CreateUserResponse)
+@app.post("/auth/admin/users", response_model=CreateUserResponse,
+          openapi_extra=json_body_schema(CreateUserRequest))
 def create_user_by_admin(
-    request: CreateUserRequest,
+    request: CreateUserRequest = json_body(CreateUserRequest),
     authorization: Optional[str] = Header(None)
 ):
     """Admin endpoint to create a new user.
@@ -631,44 +732,14 @@ def create_user_by_admin(
     """
     verify_admin_jwt(authorization)
     
-    email_addr = request.email.lower()
-    
-    # Check if user already exists
-    existing_user = users.find_user_by_email(email_addr)
-    if existing_user:
-        raise HTTPException(
-            status_code=409,
-            detail=f"User with email {email_addr} already exists"
-        )
-    
-    # Create user
-    try:
-        user = users.create_user(email_addr, request.phone, request.preference, request.role)
-    except ValueError as e:
-        raise HTTPException(status_code=400, detail=str(e))
-    
-    user_dict = user.to_dict()
-    return CreateUserResponse(
-        success=True,
-        message=f"User {email_addr} created successfully",
-        user=UserProfile(
-            id=user_dict["id"],
-            email=user_dict["email"],
-            phone=user_dict.get("phone"),
-            otpPreference=user_dict.get("otp_preference"),
-            role=user_dict["role"],
-            isActive=user_dict["is_active"],
-            verifiedAt=user_dict.get("verified_at"),
-            createdAt=user_dict.get("created_at"),
-            lastLoginAt=user_dict.get("last_login_at")
-        )
-    )
+    return _create_user(request)
 
 
-@app.patch("/auth/admin/users/{user_id}", response_model=UpdateUserResponse)
+@app.patch("/auth/admin/users/{user_id}", response_model=UpdateUserResponse,
+           openapi_extra=json_body_schema(UpdateUserRequest))
 def update_user_admin(
     user_id: str,
-    update_data: UpdateUserRequest,
+    update_data: UpdateUserRequest = json_body(UpdateUserRequest),
     authorization: Optional[str] = Header(None)
 ):
     """Admin endpoint to update a user.
@@ -680,13 +751,13 @@ def update_user_admin(
     # Find user
     user = users.find_user_by_id(user_id)
     if not user:
-        raise HTTPException(status_code=404, detail="User not found")
+        raise _ERR_USER_NOT_FOUND.with_traceback(None)
     
     # Update user
     try:
         updated_user = users.update_user(
             user_id=user_id,
-            email=update_data.email,
+            email=users.normalize_email(update_data.email) if update_data.email is not None else None,
             phone=update_data.phone,
             otp_preference=update_data.preference,
             role=update_data.role,
@@ -700,17 +771,7 @@ def update_user_admin(
     return UpdateUserResponse(
         success=True,
         message=f"User {user_dict['email']} updated successfully",
-        user=UserProfile(
-            id=user_dict["id"],
-            email=user_dict["email"],
-            phone=user_dict.get("phone"),
-            otpPreference=user_dict.get("otp_preference"),
-            role=user_dict["role"],
-            isActive=user_dict["is_active"],
-            verifiedAt=user_dict.get("verified_at"),
-            createdAt=user_dict.get("created_at"),
-            lastLoginAt=user_dict.get("last_login_at")
-        )
+        user=_user_profile(user_dict)
     )
 
 
@@ -728,7 +789,7 @@ def delete_user_admin(
     # Find user
     user = users.find_user_by_id(user_id)
     if not user:
-        raise HTTPException(status_code=404, detail="User not found")
+        raise _ERR_USER_NOT_FOUND.with_traceback(None)
     
     email = user.to_dict()["email"]
     
@@ -769,7 +830,7 @@ def list_tenants_admin(authorization: Optional[str] = Header(None)):
     """
     verify_admin_jwt(authorization)
     
-    dsn = os.environ.get("DATABASE_URL")
+    dsn = envs.DATABASE_URL
     if not dsn or psycopg is None:
         raise HTTPException(status_code=500, detail="Database not configured")
     
@@ -793,19 +854,21 @@ def list_tenants_admin(authorization: Optional[str] = Header(None)):
                 """)
                 rows = cur.fetchall()
                 
-                tenants = []
-                for row in rows:
-                    tenants.append(TenantResponse(
-                        id=str(row['id']),
-                        provider=row['provider'],
-                        externalTenantId=row['external_tenant_id'],
-                        externalAccountId=row['external_account_id'],
-                        displayName=row['display_name'],
-                        metadata=row['metadata'] or {},
-                        createdAt=row['created_at'].isoformat(),
-                        updatedAt=row['updated_at'].isoformat(),
-                        lastRefreshedAt=row['last_refreshed_at'].isoformat() if row['last_refreshed_at'] else None
-                    ))
+                # Default tuple rows, unpacked positionally in SELECT order
+                tenants = [None] * len(rows)
+                for i, (tid, provider, ext_tenant, ext_account, display_name,
+                        metadata, created_at, updated_at, last_refreshed_at) in enumerate(rows):
+                    tenants[i] = TenantResponse.model_construct(
+                        id=str(tid),
+                        provider=provider,
+                        externalTenantId=ext_tenant,
+                        externalAccountId=ext_account,
+                        displayName=display_name,
+                        metadata=metadata or {},
+                        createdAt=created_at.isoformat(),
+                        updatedAt=updated_at.isoformat(),
+                        lastRefreshedAt=last_refreshed_at.isoformat() if last_refreshed_at else None
+                    )
                 
                 return ListTenantsResponse(tenants=tenants)
     except Exception as e:
@@ -821,7 +884,7 @@ def delete_tenant_admin(tenant_id: str, authorization: Optional[str] = Header(No
     """
     verify_admin_jwt(authorization)
     
-    dsn = os.environ.get("DATABASE_URL")
+    dsn = envs.DATABASE_URL
     if not dsn or psycopg is None:
         raise HTTPException(status_code=500, detail="Database not configured")
     
@@ -850,10 +913,10 @@ def get_settings_admin(authorization: Optional[str] = Header(None)):
     verify_admin_jwt(authorization)
     
     return SystemSettings(
-        otpExpiry=int(os.environ.get("OTP_EXPIRY_MINUTES", "5")),
-        otpMaxAttempts=int(os.environ.get("OTP_MAX_ATTEMPTS", "8")),
-        rateLimitWindow=int(os.environ.get("RATE_LIMIT_WINDOW_MINUTES", "15")),
-        rateLimitMaxRequests=int(os.environ.get("RATE_LIMIT_MAX_REQUESTS", "3"))
+        otpExpiry=envs.OTP_EXPIRY_MINUTES,
+        otpMaxAttempts=envs.OTP_MAX_ATTEMPTS,
+        rateLimitWindow=envs.RATE_LIMIT_WINDOW_MINUTES,
+        rateLimitMaxRequests=envs.RATE_LIMIT_MAX_REQUESTS
     )
 
 
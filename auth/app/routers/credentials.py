@@ -1,16 +1,25 @@
 """Credentials management routes for OAuth integrations."""
-from fastapi import APIRouter, HTTPException, Header, Depends
+import logging
+from fastapi import APIRouter, HTTPException, Header, Depends, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from typing import List, Optional
 from uuid import UUID
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, TypeAdapter
 from datetime import datetime
+import psycopg
+from psycopg.rows import tuple_row
 from ..services.jwt import verify_jwt
-from ..services.database import get_db_connection
+from ..services.database import async_pool
+from ..services.oauth import encrypt_token
+from ..services.credential_config import invalidate_credential_config
 import os
 
 
 router = APIRouter(prefix="/auth/credentials", tags=["credentials"])
 
+log = logging.getLogger("auth.credentials")
+
 
 # Request/Response Models
 class CreateCredentialRequest(BaseModel):
@@ -62,13 +71,136 @@ class CredentialResponse(BaseModel):
     updated_at: datetime
 
 
+_credential_list_adapter = TypeAdapter(List[CredentialResponse])
+
+
+# SQL statements, fixed so psycopg can prepare them once per pooled
+# connection (prepare=True) and skip parse/plan on later calls
+LIST_CREDENTIALS_SQL = """
+    SELECT 
+        id, name, display_name, provider, client_id,
+        redirect_uri, tenant_id, authorization_url, token_url, scopes,
+        connected_email, external_account_id, connected_display_name,
+        status, error_message, last_connected_at,
+        created_at, created_by, updated_at
+    FROM auth.credentials
+    ORDER BY created_at DESC
+"""
+
+CREATOR_EMAILS_SQL = """
+    SELECT id, email FROM auth.users
+    WHERE id IN (SELECT created_by FROM auth.credentials)
+"""
+
+# Changes whenever a credential is added, removed or updated
+CREDENTIALS_VERSION_SQL = "SELECT MAX(updated_at), COUNT(*) FROM auth.credentials"
+
+GET_CREDENTIAL_SQL = """
+    SELECT 
+        c.id, c.name, c.display_name, c.provider, c.client_id,
+        c.redirect_uri, c.tenant_id, c.authorization_url, c.token_url, c.scopes,
+        c.connected_email, c.external_account_id, c.connected_display_name,
+        c.status, c.error_message, c.last_connected_at,
+        c.created_at, u.email as created_by_email, c.updated_at
+    FROM auth.credentials c
+    LEFT JOIN auth.users u ON c.created_by = u.id
+    WHERE c.id = %s
+"""
+
+INSERT_CREDENTIAL_SQL = """
+    WITH c AS (
+        INSERT INTO auth.credentials (
+            name, display_name, provider, client_id, encrypted_client_secret,
+            redirect_uri, tenant_id, authorization_url, token_url, scopes,
+            status, created_by
+        ) VALUES (
+            %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, 'pending', %s
+        )
+        RETURNING *
+    )
+    SELECT 
+        c.id, c.name, c.display_name, c.provider, c.client_id,
+        c.redirect_uri, c.tenant_id, c.authorization_url, c.token_url, c.scopes,
+        c.connected_email, c.external_account_id, c.connected_display_name,
+        c.status, c.error_message, c.last_connected_at,
+        c.created_at, u.email as created_by_email, c.updated_at
+    FROM c
+    LEFT JOIN auth.users u ON c.created_by = u.id
+"""
+
+UPDATE_CREDENTIAL_SQL = """
+    WITH c AS (
+        UPDATE auth.credentials
+        SET display_name = COALESCE(%(display_name)s::text, display_name),
+            client_id = COALESCE(%(client_id)s::text, client_id),
+            encrypted_client_secret = COALESCE(%(encrypted_client_secret)s::text, encrypted_client_secret),
+            redirect_uri = COALESCE(%(redirect_uri)s::text, redirect_uri),
+            tenant_id = COALESCE(%(tenant_id)s::text, tenant_id),
+            authorization_url = COALESCE(%(authorization_url)s::text, authorization_url),
+            token_url = COALESCE(%(token_url)s::text, token_url),
+            scopes = COALESCE(%(scopes)s::text[], scopes),
+            -- Changing the OAuth app config invalidates the existing connection
+            status = CASE
+                WHEN %(client_id)s::text IS NOT NULL
+                  OR %(encrypted_client_secret)s::text IS NOT NULL
+                  OR %(redirect_uri)s::text IS NOT NULL
+                  OR %(tenant_id)s::text IS NOT NULL
+                  OR %(scopes)s::text[] IS NOT NULL
+                THEN 'pending'
+                ELSE status
+            END,
+            updated_at = now()
+        WHERE id = %(id)s
+        RETURNING *
+    )
+    SELECT 
+        c.id, c.name, c.display_name, c.provider, c.client_id,
+        c.redirect_uri, c.tenant_id, c.authorization_url, c.token_url, c.scopes,
+        c.connected_email, c.external_account_id, c.connected_display_name,
+        c.status, c.error_message, c.last_connected_at,
+        c.created_at, u.email as created_by_email, c.updated_at
+    FROM c
+    LEFT JOIN auth.users u ON c.created_by = u.id
+"""
+
+DELETE_CREDENTIAL_SQL = "DELETE FROM auth.credentials WHERE id = %s"
+
+
+# Provider defaults (static parts built once at import)
+# openid/profile make the token response carry an id_token, which the OAuth
+# callback reads instead of calling the user-info endpoint
+_MS365_SCOPES: tuple[str, ...] = (
+    "openid",
+    "profile",
+    "offline_access",
+    "https://graph.microsoft.com/Mail.Read",
+    "https://graph.microsoft.com/Mail.Send",
+    "https://graph.microsoft.com/User.Read",
+)
+
+_GOOGLE_DEFAULTS: dict = {
+    "authorization_url": "https://accounts.google.com/o/oauth2/v2/auth",
+    "token_url": "https://oauth2.googleapis.com/token",
+    "scopes": (
+        "openid",
+        "profile",
+        "https://www.googleapis.com/auth/gmail.readonly",
+        "https://www.googleapis.com/auth/gmail.send",
+        "https://www.googleapis.com/auth/userinfo.email",
+    ),
+}
+
+
+_BEARER = "Bearer "
+
+
 # Helper functions
 def verify_admin(authorization: str = Header(..., alias="Authorization")) -> dict:
     """Verify JWT and ensure user has admin role."""
-    if not authorization.startswith("Bearer "):
+    if authorization[:7] != _BEARER:
         raise HTTPException(status_code=401, detail="Invalid authorization header")
     
-    token = authorization.replace("Bearer ", "")
+    token = authorization[7:]
     try:
         payload = verify_jwt(token)
         if payload.get("role") != "admin":
@@ -87,84 +219,169 @@ def get_provider_defaults(provider: str, tenant_id: Optional[str] = None) -> dic
         tenant_id: Azure AD Tenant ID for MS365 single-tenant apps (optional)
     
     Returns:
-        Dict with authorization_url, token_url, and scopes
+        Dict with authorization_url, token_url, and scopes (a tuple).
+        The dict may be shared between calls and must not be mutated.
     """
     if provider == "ms365":
         # Use tenant-specific endpoint if tenant_id provided, otherwise use /common
-        tenant_segment = tenant_id if tenant_id else "common"
+        base = f"https://login.microsoftonline.com/{tenant_id or 'common'}/oauth2/v2.0"
         return {
-            "authorization_url": f"https://login.microsoftonline.com/{tenant_segment}/oauth2/v2.0/authorize",
-            "token_url": f"https://login.microsoftonline.com/{tenant_segment}/oauth2/v2.0/token",
-            "scopes": [
-                "offline_access",
-                "https://graph.microsoft.com/Mail.Read",
-                "https://graph.microsoft.com/Mail.Send",
-                "https://graph.microsoft.com/User.Read",
-            ]
+            "authorization_url": f"{base}/authorize",
+            "token_url": f"{base}/token",
+            "scopes": _MS365_SCOPES,
         }
     elif provider == "google_workspace":
-        return {
-            "authorization_url": "https://accounts.google.com/o/oauth2/v2/auth",
-            "token_url": "https://oauth2.googleapis.com/token",
-            "scopes": [
-                "https://www.googleapis.com/auth/gmail.readonly",
-                "https://www.googleapis.com/auth/gmail.send",
-                "https://www.googleapis.com/auth/userinfo.email",
-            ]
-        }
+        return _GOOGLE_DEFAULTS
     else:
         raise HTTPException(status_code=400, detail=f"Unknown provider: {provider}")
 
 
+def _credential_response(row: dict, created_by: Optional[str]) -> CredentialResponse:
+    """Build a CredentialResponse from a credentials row.
+    
+    Uses model_construct since the row comes straight from the database and
+    needs no re-validation.
+    """
+    return CredentialResponse.model_construct(
+        id=str(row['id']),
+        name=row['name'],
+        display_name=row['display_name'],
+        provider=row['provider'],
+        client_id=row['client_id'],
+        redirect_uri=row['redirect_uri'],
+        tenant_id=row['tenant_id'],
+        authorization_url=row['authorization_url'],
+        token_url=row['token_url'],
+        scopes=row['scopes'],
+        connected_email=row['connected_email'],
+        external_account_id=row['external_account_id'],
+        connected_display_name=row['connected_display_name'],
+        status=row['status'],
+        error_message=row['error_message'],
+        last_connected_at=row['last_connected_at'],
+        created_at=row['created_at'],
+        created_by=created_by,
+        updated_at=row['updated_at']
+    )
+
+
+def _etag(updated_at: Optional[datetime], count: Optional[int] = None) -> str:
+    """Build an ETag from a last-modified timestamp (and optional row count)."""
+    tag = "%x" % int(updated_at.timestamp() * 1_000_000) if updated_at else "0"
+    if count is not None:
+        tag = f"{tag}-{count}"
+    return f'"{tag}"'
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Check an If-None-Match header value against an ETag (weak comparison)."""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+# Rows fetched per round trip when streaming the credentials list
+_LIST_CHUNK_ROWS = 500
+
+
+async def _stream_credentials():
+    """Yield the credentials list as JSON array chunks.
+    
+    The first chunk is yielded only once the queries have run, so callers
+    can prime the generator to surface database errors before streaming.
+    Rows are read from a server-side cursor in _LIST_CHUNK_ROWS batches and
+    encoded batch by batch; the full list is never held in memory.
+    """
+    async with async_pool.connection() as conn:
+        # Creators are a small set of admins: resolve their emails in one
+        # lookup instead of joining users onto every credential
+        async with conn.cursor(row_factory=tuple_row) as cur:
+            await cur.execute(CREATOR_EMAILS_SQL, prepare=True)
+            email_by_id = dict(await cur.fetchall())
+        
+        # Plain tuples, unpacked positionally: no per-row dict to build and index
+        async with conn.cursor("credentials_list", row_factory=tuple_row) as cur:
+            await cur.execute(LIST_CREDENTIALS_SQL)
+            yield b"["
+            sep = b""
+            while rows := await cur.fetchmany(_LIST_CHUNK_ROWS):
+                chunk = _credential_list_adapter.dump_json([
+                    CredentialResponse.model_construct(
+                        id=str(id_),
+                        name=name,
+                        display_name=display_name,
+                        provider=provider,
+                        client_id=client_id,
+                        redirect_uri=redirect_uri,
+                        tenant_id=tenant_id,
+                        authorization_url=authorization_url,
+                        token_url=token_url,
+                        scopes=scopes,
+                        connected_email=connected_email,
+                        external_account_id=external_account_id,
+                        connected_display_name=connected_display_name,
+                        status=status,
+                        error_message=error_message,
+                        last_connected_at=last_connected_at,
+                        created_at=created_at,
+                        created_by=email_by_id.get(created_by),
+                        updated_at=updated_at
+                    )
+                    for (
+                        id_, name, display_name, provider, client_id,
+                        redirect_uri, tenant_id, authorization_url, token_url, scopes,
+                        connected_email, external_account_id, connected_display_name,
+                        status, error_message, last_connected_at,
+                        created_at, created_by, updated_at
+                    ) in rows
+                ])
+                # Splice each batch's items into the one outer array
+                yield sep + chunk[1:-1]
+                sep = b","
+            yield b"]"
+
+
+async def _chain(head: bytes, rest):
+    """Re-attach an already consumed first chunk to an async byte stream."""
+    yield head
+    async for chunk in rest:
+        yield chunk
+
+
 # Endpoints
 @router.get("/", response_model=List[CredentialResponse])
-async def list_credentials(admin_payload: dict = Depends(verify_admin)):
+async def list_credentials(
+    if_none_match: Optional[str] = Header(None),
+    admin_payload: dict = Depends(verify_admin)
+):
     """
     List all credentials (admin only).
     
     Returns all configured OAuth credentials with their connection status.
-    Client secrets are never returned.
+    Client secrets are never returned. Responses carry an ETag; a matching
+    If-None-Match gets 304 Not Modified without reading the rows.
     """
-    with get_db_connection() as conn:
-        with conn.cursor() as cur:
-            cur.execute("""
-                SELECT 
-                    c.id, c.name, c.display_name, c.provider, c.client_id,
-                    c.redirect_uri, c.tenant_id, c.authorization_url, c.token_url, c.scopes,
-                    c.connected_email, c.external_account_id, c.connected_display_name,
-                    c.status, c.error_message, c.last_connected_at,
-                    c.created_at, u.email as created_by_email, c.updated_at
-                FROM auth.credentials c
-                LEFT JOIN auth.users u ON c.created_by = u.id
-                ORDER BY c.created_at DESC
-            """)
-            
-            rows = cur.fetchall()
-            
-            return [
-                CredentialResponse(
-                    id=str(row['id']),
-                    name=row['name'],
-                    display_name=row['display_name'],
-                    provider=row['provider'],
-                    client_id=row['client_id'],
-                    redirect_uri=row['redirect_uri'],
-                    tenant_id=row['tenant_id'],
-                    authorization_url=row['authorization_url'],
-                    token_url=row['token_url'],
-                    scopes=row['scopes'],
-                    connected_email=row['connected_email'],
-                    external_account_id=row['external_account_id'],
-                    connected_display_name=row['connected_display_name'],
-                    status=row['status'],
-                    error_message=row['error_message'],
-                    last_connected_at=row['last_connected_at'],
-                    created_at=row['created_at'],
-                    created_by=row['created_by_email'],
-                    updated_at=row['updated_at']
-                )
-                for row in rows
-            ]
+    async with async_pool.connection() as conn:
+        async with conn.cursor(row_factory=tuple_row) as cur:
+            await cur.execute(CREDENTIALS_VERSION_SQL, prepare=True)
+            last_updated_at, count = await cur.fetchone()
+    etag = _etag(last_updated_at, count)
+    if _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    
+    stream = _stream_credentials()
+    # Run the queries now so database errors become a normal 500 rather
+    # than a truncated 200 body
+    head = await stream.__anext__()
+    # Encoded straight to JSON bytes; FastAPI would otherwise re-validate
+    # every item against response_model
+    return StreamingResponse(
+        _chain(head, stream), media_type="application/json", headers={"ETag": etag}
+    )
 
 
 @router.post("/", response_model=CredentialResponse, status_code=201)
@@ -177,130 +394,72 @@ async def create_credential(
     
     Creates credential in 'pending' status. Use OAuth flow to connect.
     """
-    from ..services.oauth import encrypt_token
-    
     # Get provider defaults (pass tenant_id for MS365 single-tenant)
     defaults = get_provider_defaults(request.provider, request.tenant_id)
     
     # Use provided values or defaults
     authorization_url = request.authorization_url or defaults["authorization_url"]
     token_url = request.token_url or defaults["token_url"]
-    scopes = request.scopes or defaults["scopes"]
+    # psycopg adapts lists (not tuples) to Postgres arrays
+    scopes = request.scopes or list(defaults["scopes"])
     
-    # Encrypt client secret
-    encrypted_secret = encrypt_token(request.client_secret)
+    # Encrypt client secret off the event loop (the first call also derives
+    # the Fernet key with PBKDF2)
+    encrypted_secret = await run_in_threadpool(encrypt_token, request.client_secret)
     
-    user_id = UUID(admin_payload["userId"])
+    user_id = admin_payload["_userId_uuid"]
     
-    with get_db_connection() as conn:
-        with conn.cursor() as cur:
+    async with async_pool.connection() as conn:
+        async with conn.cursor() as cur:
             try:
-                cur.execute("""
-                    INSERT INTO auth.credentials (
-                        name, display_name, provider, client_id, encrypted_client_secret,
-                        redirect_uri, tenant_id, authorization_url, token_url, scopes,
-                        status, created_by
-                    ) VALUES (
-                        %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, 'pending', %s
-                    )
-                    RETURNING 
-                        id, name, display_name, provider, client_id,
-                        redirect_uri, tenant_id, authorization_url, token_url, scopes,
-                        connected_email, external_account_id, connected_display_name,
-                        status, error_message, last_connected_at,
-                        created_at, created_by, updated_at
-                """, (
+                await cur.execute(INSERT_CREDENTIAL_SQL, (
                     request.name, request.display_name, request.provider,
                     request.client_id, encrypted_secret, request.redirect_uri,
                     request.tenant_id, authorization_url, token_url, scopes, user_id
-                ))
+                ), prepare=True)
                 
-                row = cur.fetchone()
-                conn.commit()
+                row = await cur.fetchone()
+                await conn.commit()
                 
-                return CredentialResponse(
-                    id=str(row['id']),
-                    name=row['name'],
-                    display_name=row['display_name'],
-                    provider=row['provider'],
-                    client_id=row['client_id'],
-                    redirect_uri=row['redirect_uri'],
-                    tenant_id=row['tenant_id'],
-                    authorization_url=row['authorization_url'],
-                    token_url=row['token_url'],
-                    scopes=row['scopes'],
-                    connected_email=row['connected_email'],
-                    external_account_id=row['external_account_id'],
-                    connected_display_name=row['connected_display_name'],
-                    status=row['status'],
-                    error_message=row['error_message'],
-                    last_connected_at=row['last_connected_at'],
-                    created_at=row['created_at'],
-                    created_by=None,  # Don't expose creator ID
-                    updated_at=row['updated_at']
-                )
+                return _credential_response(row, row['created_by_email'])
                 
-            except Exception as e:
-                conn.rollback()
-                # Log the full error for debugging
-                import traceback
-                print(f"ERROR creating credential: {str(e)}")
-                print(f"Traceback: {traceback.format_exc()}")
-                # Check for unique constraint violations
-                if "unique" in str(e).lower():
-                    if "name" in str(e).lower():
-                        raise HTTPException(status_code=409, detail=f"Credential name '{request.name}' already exists")
-                    elif "provider" in str(e).lower() and "client_id" in str(e).lower():
-                        raise HTTPException(status_code=409, detail="A credential with this provider and client_id already exists")
-                raise HTTPException(status_code=500, detail=f"Failed to create credential: {str(e)}")
+            except psycopg.errors.UniqueViolation as e:
+                await conn.rollback()
+                if e.diag.constraint_name == "credentials_name_key":
+                    raise HTTPException(status_code=409, detail=f"Credential name '{request.name}' already exists")
+                raise HTTPException(status_code=409, detail="A conflicting credential already exists")
+            except Exception:
+                await conn.rollback()
+                log.exception("create_credential failed")
+                raise HTTPException(status_code=500, detail="Failed to create credential")
 
 
 @router.get("/{credential_id}", response_model=CredentialResponse)
 async def get_credential(
     credential_id: UUID,
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
     admin_payload: dict = Depends(verify_admin)
 ):
-    """Get a specific credential by ID (admin only)."""
-    with get_db_connection() as conn:
-        with conn.cursor() as cur:
-            cur.execute("""
-                SELECT 
-                    c.id, c.name, c.display_name, c.provider, c.client_id,
-                    c.redirect_uri, c.tenant_id, c.authorization_url, c.token_url, c.scopes,
-                    c.connected_email, c.external_account_id, c.connected_display_name,
-                    c.status, c.error_message, c.last_connected_at,
-                    c.created_at, u.email as created_by_email, c.updated_at
-                FROM auth.credentials c
-                LEFT JOIN auth.users u ON c.created_by = u.id
-                WHERE c.id = %s
-            """, (credential_id,))
+    """Get a specific credential by ID (admin only).
+    
+    Supports If-None-Match against the returned ETag (derived from updated_at).
+    """
+    async with async_pool.connection() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(GET_CREDENTIAL_SQL, (credential_id,), prepare=True)
             
-            row = cur.fetchone()
+            row = await cur.fetchone()
             
             if not row:
                 raise HTTPException(status_code=404, detail="Credential not found")
             
-            return CredentialResponse(
-                id=str(row['id']),
-                name=row['name'],
-                display_name=row['display_name'],
-                provider=row['provider'],
-                client_id=row['client_id'],
-                redirect_uri=row['redirect_uri'],
-                tenant_id=row['tenant_id'],
-                authorization_url=row['authorization_url'],
-                token_url=row['token_url'],
-                scopes=row['scopes'],
-                connected_email=row['connected_email'],
-                external_account_id=row['external_account_id'],
-                connected_display_name=row['connected_display_name'],
-                status=row['status'],
-                error_message=row['error_message'],
-                last_connected_at=row['last_connected_at'],
-                created_at=row['created_at'],
-                created_by=row['created_by_email'],
-                updated_at=row['updated_at']
-            )
+            etag = _etag(row['updated_at'])
+            if _etag_matches(if_none_match, etag):
+                return Response(status_code=304, headers={"ETag": etag})
+            response.headers["ETag"] = etag
+            
+            return _credential_response(row, row['created_by_email'])
 
 
 @router.put("/{credential_id}", response_model=CredentialResponse)
@@ -314,102 +473,39 @@ async def update_credential(
     
     Can update display name, OAuth config. Updating OAuth config will reset status to 'pending'.
     """
-    from ..services.oauth import encrypt_token
-    
-    # Build dynamic UPDATE query based on provided fields
-    updates = []
-    params = []
-    
-    if request.display_name is not None:
-        updates.append("display_name = %s")
-        params.append(request.display_name)
-    
-    if request.client_id is not None:
-        updates.append("client_id = %s")
-        params.append(request.client_id)
-        updates.append("status = 'pending'")  # Reset status when OAuth config changes
-    
-    if request.client_secret is not None:
-        updates.append("encrypted_client_secret = %s")
-        params.append(encrypt_token(request.client_secret))
-        updates.append("status = 'pending'")
-    
-    if request.redirect_uri is not None:
-        updates.append("redirect_uri = %s")
-        params.append(request.redirect_uri)
-        updates.append("status = 'pending'")
-    
-    if request.tenant_id is not None:
-        updates.append("tenant_id = %s")
-        params.append(request.tenant_id)
-        updates.append("status = 'pending'")  # Reset status when tenant changes
-    
-    if request.authorization_url is not None:
-        updates.append("authorization_url = %s")
-        params.append(request.authorization_url)
-    
-    if request.token_url is not None:
-        updates.append("token_url = %s")
-        params.append(request.token_url)
-    
-    if request.scopes is not None:
-        updates.append("scopes = %s")
-        params.append(request.scopes)
-        updates.append("status = 'pending'")
-    
-    if not updates:
+    params = {
+        "display_name": request.display_name,
+        "client_id": request.client_id,
+        "encrypted_client_secret": (
+            await run_in_threadpool(encrypt_token, request.client_secret)
+            if request.client_secret is not None else None
+        ),
+        "redirect_uri": request.redirect_uri,
+        "tenant_id": request.tenant_id,
+        "authorization_url": request.authorization_url,
+        "token_url": request.token_url,
+        "scopes": request.scopes,
+        "id": credential_id,
+    }
+    if all(value is None for key, value in params.items() if key != "id"):
         raise HTTPException(status_code=400, detail="No fields to update")
     
-    updates.append("updated_at = now()")
-    params.append(credential_id)
-    
-    with get_db_connection() as conn:
-        with conn.cursor() as cur:
+    async with async_pool.connection() as conn:
+        async with conn.cursor() as cur:
             try:
-                query = f"""
-                    UPDATE auth.credentials 
-                    SET {', '.join(updates)}
-                    WHERE id = %s
-                    RETURNING 
-                        id, name, display_name, provider, client_id,
-                        redirect_uri, tenant_id, authorization_url, token_url, scopes,
-                        connected_email, external_account_id, connected_display_name,
-                        status, error_message, last_connected_at,
-                        created_at, created_by, updated_at
-                """
-                
-                cur.execute(query, params)
-                row = cur.fetchone()
+                await cur.execute(UPDATE_CREDENTIAL_SQL, params, prepare=True)
+                row = await cur.fetchone()
                 
                 if not row:
                     raise HTTPException(status_code=404, detail="Credential not found")
                 
-                conn.commit()
+                await conn.commit()
+                invalidate_credential_config(credential_id)
                 
-                return CredentialResponse(
-                    id=str(row['id']),
-                    name=row['name'],
-                    display_name=row['display_name'],
-                    provider=row['provider'],
-                    client_id=row['client_id'],
-                    redirect_uri=row['redirect_uri'],
-                    tenant_id=row['tenant_id'],
-                    authorization_url=row['authorization_url'],
-                    token_url=row['token_url'],
-                    scopes=row['scopes'],
-                    connected_email=row['connected_email'],
-                    external_account_id=row['external_account_id'],
-                    connected_display_name=row['connected_display_name'],
-                    status=row['status'],
-                    error_message=row['error_message'],
-                    last_connected_at=row['last_connected_at'],
-                    created_at=row['created_at'],
-                    created_by=None,
-                    updated_at=row['updated_at']
-                )
+                return _credential_response(row, row['created_by_email'])
                 
             except Exception as e:
-                conn.rollback()
+                await conn.rollback()
                 raise HTTPException(status_code=500, detail=f"Failed to update credential: {str(e)}")
 
 
@@ -423,13 +519,14 @@ async def delete_credential(
     
     Also deletes associated tokens (CASCADE).
     """
-    with get_db_connection() as conn:
-        with conn.cursor() as cur:
-            cur.execute("DELETE FROM auth.credentials WHERE id = %s", (credential_id,))
+    async with async_pool.connection() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(DELETE_CREDENTIAL_SQL, (credential_id,), prepare=True)
             
             if cur.rowcount == 0:
                 raise HTTPException(status_code=404, detail="Credential not found")
             
-            conn.commit()
+            await conn.commit()
+    invalidate_credential_config(credential_id)
     
     return None
@@ -1,21 +1,131 @@
 """OAuth flow for credentials (uses database config instead of environment variables)."""
+import hmac
+from functools import lru_cache
 from fastapi import APIRouter, HTTPException, Request
 from fastapi.responses import RedirectResponse
-from typing import Dict, Any
+from typing import Any, Awaitable, Callable, Dict, NamedTuple, Optional, Tuple
+from urllib.parse import quote, urlencode
 from uuid import UUID
-import httpx
+import jwt as pyjwt
+from pydantic_core import from_json
+from .. import envs
+from ..services.http import get_http_client
 from ..services.oauth import (
     generate_oauth_state,
     validate_oauth_state,
     decrypt_token,
     encrypt_token
 )
-from ..services.database import get_db_connection
+from ..services.database import async_pool
+from ..services.credential_config import get_authorize_config, invalidate_credential_config
 
 
 router = APIRouter(prefix="/auth/oauth", tags=["oauth"])
 
 
+# Extra authorize-URL parameters per provider
+_EXTRA_AUTH_PARAMS: Dict[str, Dict[str, str]] = {
+    "ms365": {"prompt": "select_account"},
+    "google_workspace": {"access_type": "offline", "prompt": "consent"},
+}
+
+
+# Expected X-Service-Token value, encoded once (None when SERVICE_SECRET is unset)
+_SERVICE_SECRET = envs.SERVICE_SECRET.encode() if envs.SERVICE_SECRET else None
+
+
+# SQL statements, fixed so psycopg can prepare them once per pooled
+# connection (prepare=True) and skip parse/plan on later calls. The hot
+# lookups also fetch results in binary format (binary=True), so UUID and
+# timestamptz columns skip text formatting and parsing.
+CALLBACK_CREDENTIAL_SQL = """
+    SELECT 
+        id, provider, client_id, encrypted_client_secret,
+        redirect_uri, token_url, scopes
+    FROM auth.credentials
+    WHERE id = %s
+"""
+
+# Mark the credential connected and store its tokens in one statement:
+# the token upsert only runs for the credential row the UPDATE touched
+CONNECT_CREDENTIAL_SQL = """
+    WITH c AS (
+        UPDATE auth.credentials
+        SET 
+            connected_email = %(email)s,
+            external_account_id = %(external_account_id)s,
+            connected_display_name = %(display_name)s,
+            status = 'connected',
+            error_message = NULL,
+            last_connected_at = now(),
+            updated_at = now()
+        WHERE id = %(credential_id)s
+        RETURNING id
+    )
+    INSERT INTO auth.credential_tokens (
+        credential_id, token_type, encrypted_access_token,
+        encrypted_refresh_token, scopes, expires_at
+    )
+    SELECT 
+        c.id, 'delegated', %(access_token)s, %(refresh_token)s, %(scopes)s,
+        now() + interval '1 hour' * %(expires_hours)s
+    FROM c
+    ON CONFLICT (credential_id) DO UPDATE
+    SET 
+        encrypted_access_token = EXCLUDED.encrypted_access_token,
+        encrypted_refresh_token = EXCLUDED.encrypted_refresh_token,
+        scopes = EXCLUDED.scopes,
+        expires_at = EXCLUDED.expires_at,
+        last_refreshed_at = now()
+"""
+
+MARK_ERROR_SQL = """
+    UPDATE auth.credentials
+    SET status = 'error', error_message = %s, updated_at = now()
+    WHERE id = %s
+"""
+
+# Connected credential plus its stored tokens, looked up by whichever one
+# identifier is non-NULL; a single statement (and plan) for all four
+CREDENTIAL_TOKEN_SQL = """
+    SELECT c.id, c.provider, c.client_id, c.encrypted_client_secret,
+           c.token_url, ct.encrypted_access_token, ct.encrypted_refresh_token,
+           ct.expires_at,
+           ct.expires_at < now() + interval '5 minutes' AS needs_refresh
+    FROM auth.credentials c
+    LEFT JOIN auth.credential_tokens ct ON c.id = ct.credential_id
+    WHERE (c.id = %(id)s::uuid
+           OR c.name = %(name)s::text
+           OR c.connected_email = %(email)s::text
+           OR c.external_account_id = %(ext)s::text)
+      AND c.status = 'connected'
+    LIMIT 1
+"""
+
+# Same lookup as CREDENTIAL_TOKEN_SQL, without the encrypted columns
+CREDENTIAL_TOKEN_METADATA_SQL = """
+    SELECT c.id, c.provider, ct.expires_at
+    FROM auth.credentials c
+    LEFT JOIN auth.credential_tokens ct ON c.id = ct.credential_id
+    WHERE (c.id = %(id)s::uuid
+           OR c.name = %(name)s::text
+           OR c.connected_email = %(email)s::text
+           OR c.external_account_id = %(ext)s::text)
+      AND c.status = 'connected'
+    LIMIT 1
+"""
+
+REFRESH_TOKEN_SQL = """
+    UPDATE auth.credential_tokens
+    SET 
+        encrypted_access_token = %s,
+        expires_at = now() + interval '1 hour' * %s,
+        last_refreshed_at = now()
+    WHERE credential_id = %s
+    RETURNING expires_at
+"""
+
+
 @router.get("/authorize")
 async def authorize_oauth(credential_id: str, request: Request) -> Dict[str, str]:
     """
@@ -31,30 +141,10 @@ async def authorize_oauth(credential_id: str, request: Request) -> Dict[str, str
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid credential_id format")
     
-    # Get credential from database
-    with get_db_connection() as conn:
-        with conn.cursor() as cur:
-            cur.execute("""
-                SELECT 
-                    id, provider, client_id, redirect_uri, 
-                    authorization_url, scopes
-                FROM auth.credentials
-                WHERE id = %s
-            """, (cred_uuid,))
-            
-            row = cur.fetchone()
-            
-            if not row:
-                raise HTTPException(status_code=404, detail="Credential not found")
-            
-            credential = {
-                "id": str(row['id']),
-                "provider": row['provider'],
-                "client_id": row['client_id'],
-                "redirect_uri": row['redirect_uri'],
-                "authorization_url": row['authorization_url'],
-                "scopes": row['scopes']
-            }
+    # Get credential config (cached per credential for a short TTL)
+    credential = await get_authorize_config(cred_uuid)
+    if not credential:
+        raise HTTPException(status_code=404, detail="Credential not found")
     
     # Generate state for CSRF protection
     state = generate_oauth_state(cred_uuid, credential["provider"])
@@ -72,14 +162,10 @@ async def authorize_oauth(credential_id: str, request: Request) -> Dict[str, str
     }
     
     # Add provider-specific parameters
-    if credential["provider"] == "ms365":
-        params["prompt"] = "select_account"
-    elif credential["provider"] == "google_workspace":
-        params["access_type"] = "offline"
-        params["prompt"] = "consent"
+    params.update(_EXTRA_AUTH_PARAMS.get(credential["provider"], {}))
     
     # Build query string
-    query_string = "&".join([f"{k}={httpx.QueryParams({k: v})[k]}" for k, v in params.items()])
+    query_string = urlencode(params, quote_via=quote)
     auth_url = f"{credential['authorization_url']}?{query_string}"
     
     # Return JSON with authorization URL for frontend to redirect to
@@ -110,19 +196,15 @@ async def oauth_callback(code: str = None, state: str = None, error: str = None,
     if not credential_id:
         raise HTTPException(status_code=400, detail="Invalid or expired state")
     
-    try:
-        # Get credential details from database
-        with get_db_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute("""
-                    SELECT 
-                        id, provider, client_id, encrypted_client_secret,
-                        redirect_uri, token_url, scopes
-                    FROM auth.credentials
-                    WHERE id = %s
-                """, (credential_id,))
+    # One pooled connection for the whole callback: the credential lookup,
+    # the final write, and the error-status write if anything fails
+    async with async_pool.connection() as conn:
+        try:
+            # Get credential details from database
+            async with conn.cursor() as cur:
+                await cur.execute(CALLBACK_CREDENTIAL_SQL, (credential_id,), prepare=True, binary=True)
                 
-                row = cur.fetchone()
+                row = await cur.fetchone()
                 
                 if not row:
                     raise HTTPException(status_code=404, detail="Credential not found")
@@ -131,97 +213,65 @@ async def oauth_callback(code: str = None, state: str = None, error: str = None,
                     "id": str(row['id']),
                     "provider": row['provider'],
                     "client_id": row['client_id'],
-                    "client_secret": decrypt_token(row['encrypted_client_secret']),
+                    "client_secret": _decrypt_client_secret(row['encrypted_client_secret']),
                     "redirect_uri": row['redirect_uri'],
                     "token_url": row['token_url'],
                     "scopes": row['scopes']
                 }
-        
-        # Exchange code for tokens
-        tokens = await exchange_code_for_tokens(
-            code=code,
-            client_id=credential["client_id"],
-            client_secret=credential["client_secret"],
-            redirect_uri=credential["redirect_uri"],
-            token_url=credential["token_url"]
-        )
-        
-        # Get user info from provider
-        if credential["provider"] == "ms365":
-            user_info = await get_ms365_user_info(tokens["access_token"])
-            external_account_id = user_info.get("id")
-            email = user_info.get("userPrincipalName") or user_info.get("mail")
-            display_name = user_info.get("displayName")
-        elif credential["provider"] == "google_workspace":
-            user_info = await get_google_user_info(tokens["access_token"])
-            external_account_id = user_info.get("sub")
-            email = user_info.get("email")
-            display_name = user_info.get("name")
-        else:
-            raise HTTPException(status_code=400, detail=f"Unknown provider: {credential['provider']}")
-        
-        # Store tokens and update credential status
-        with get_db_connection() as conn:
-            with conn.cursor() as cur:
-                # Update credential with connection info
-                cur.execute("""
-                    UPDATE auth.credentials
-                    SET 
-                        connected_email = %s,
-                        external_account_id = %s,
-                        connected_display_name = %s,
-                        status = 'connected',
-                        error_message = NULL,
-                        last_connected_at = now(),
-                        updated_at = now()
-                    WHERE id = %s
-                """, (email, external_account_id, display_name, credential_id))
-                
-                # Store or update tokens
-                cur.execute("""
-                    INSERT INTO auth.credential_tokens (
-                        credential_id, token_type, encrypted_access_token,
-                        encrypted_refresh_token, scopes, expires_at
-                    ) VALUES (
-                        %s, 'delegated', %s, %s, %s, 
-                        now() + interval '1 hour' * %s
-                    )
-                    ON CONFLICT (credential_id) DO UPDATE
-                    SET 
-                        encrypted_access_token = EXCLUDED.encrypted_access_token,
-                        encrypted_refresh_token = EXCLUDED.encrypted_refresh_token,
-                        scopes = EXCLUDED.scopes,
-                        expires_at = EXCLUDED.expires_at,
-                        last_refreshed_at = now()
-                """, (
-                    credential_id,
-                    encrypt_token(tokens["access_token"]),
-                    encrypt_token(tokens.get("refresh_token", "")),
-                    credential["scopes"],
-                    tokens.get("expires_in", 3600) / 3600.0  # Convert seconds to hours
-                ))
+            
+            # Exchange code for tokens
+            tokens = await exchange_code_for_tokens(
+                code=code,
+                client_id=credential["client_id"],
+                client_secret=credential["client_secret"],
+                redirect_uri=credential["redirect_uri"],
+                token_url=credential["token_url"]
+            )
+            
+            # Identity comes from the id_token when the provider sent one with all
+            # the fields we need; otherwise ask the user-info endpoint
+            provider = _PROVIDERS.get(credential["provider"])
+            if provider is None:
+                raise HTTPException(status_code=400, detail=f"Unknown provider: {credential['provider']}")
+            identity = _identity_from_id_token(credential["provider"], tokens.get("id_token"))
+            if not identity:
+                user_info = await provider.fetch_user_info(tokens["access_token"])
+                identity = provider.user_info_identity(user_info)
+            external_account_id, email, display_name = identity
+            
+            # Store tokens and update credential status. Pipeline mode sends the
+            # statement and its COMMIT together: one round trip for the write path
+            async with conn.pipeline(), conn.cursor() as cur:
+                await cur.execute(CONNECT_CREDENTIAL_SQL, {
+                    "credential_id": credential_id,
+                    "email": email,
+                    "external_account_id": external_account_id,
+                    "display_name": display_name,
+                    "access_token": encrypt_token(tokens["access_token"]),
+                    "refresh_token": encrypt_token(tokens.get("refresh_token", "")),
+                    "scopes": credential["scopes"],
+                    "expires_hours": tokens.get("expires_in", 3600) / 3600.0,  # Convert seconds to hours
+                }, prepare=True)
                 
-                conn.commit()
-        
-        # Redirect to UI success page
-        return RedirectResponse(url="/admin/credentials?success=true")
-        
-    except Exception as e:
-        # Update credential status to error
-        try:
-            with get_db_connection() as conn:
-                with conn.cursor() as cur:
-                    cur.execute("""
-                        UPDATE auth.credentials
-                        SET status = 'error', error_message = %s, updated_at = now()
-                        WHERE id = %s
-                    """, (str(e), credential_id))
-                    conn.commit()
-        except:
-            pass  # Ignore errors in error handling
-        
-        # Redirect to UI with error
-        return RedirectResponse(url=f"/admin/credentials?error={str(e)}")
+                await conn.commit()
+            invalidate_credential_config(credential_id)
+            
+            # Redirect to UI success page
+            return RedirectResponse(url="/admin/credentials?success=true")
+            
+        except Exception as e:
+            # Update credential status to error on the same connection, after
+            # discarding whatever the failed step left in its transaction
+            try:
+                await conn.rollback()
+                async with conn.pipeline(), conn.cursor() as cur:
+                    await cur.execute(MARK_ERROR_SQL, (str(e), credential_id), prepare=True)
+                    await conn.commit()
+            except Exception:
+                pass  # Ignore errors in error handling
+            
+            # Redirect to UI with error
+            return RedirectResponse(url=f"/admin/credentials?error={str(e)}")
 
 
 # Internal endpoint for API service to request tokens
@@ -238,15 +288,17 @@ async def get_credential_token_internal(request: Request) -> Dict[str, Any]:
     - credential_name (string)
     - email (string)
     - external_account_id (string)
-    """
-    import os
-    from datetime import datetime, timezone
     
+    Set "metadata_only": true to get credential_id, provider and expires_at
+    without the access token (no decryption and no refresh).
+    """
     # Validate service token
     service_token = request.headers.get("X-Service-Token")
-    expected_token = os.environ.get("SERVICE_SECRET")
     
-    if not service_token or service_token != expected_token:
+    # Constant-time compare so response timing does not leak the secret
+    if not service_token or not _SERVICE_SECRET or not hmac.compare_digest(
+        service_token.encode(), _SERVICE_SECRET
+    ):
         raise HTTPException(status_code=401, detail="Invalid service token")
     
     # Get credential identifier from request body
@@ -262,55 +314,40 @@ async def get_credential_token_internal(request: Request) -> Dict[str, Any]:
             detail="Must provide one of: credential_id, credential_name, email, or external_account_id"
         )
     
-    # Build query based on provided identifier
-    with get_db_connection() as conn:
-        with conn.cursor() as cur:
-            if credential_id:
-                try:
-                    cred_uuid = UUID(credential_id)
-                except ValueError:
-                    raise HTTPException(status_code=400, detail="Invalid credential_id format")
-                
-                cur.execute("""
-                    SELECT c.id, c.provider, c.client_id, c.encrypted_client_secret,
-                           c.token_url, ct.encrypted_access_token, ct.encrypted_refresh_token,
-                           ct.expires_at, c.scopes
-                    FROM auth.credentials c
-                    LEFT JOIN auth.credential_tokens ct ON c.id = ct.credential_id
-                    WHERE c.id = %s AND c.status = 'connected'
-                """, (cred_uuid,))
-            
-            elif credential_name:
-                cur.execute("""
-                    SELECT c.id, c.provider, c.client_id, c.encrypted_client_secret,
-                           c.token_url, ct.encrypted_access_token, ct.encrypted_refresh_token,
-                           ct.expires_at, c.scopes
-                    FROM auth.credentials c
-                    LEFT JOIN auth.credential_tokens ct ON c.id = ct.credential_id
-                    WHERE c.name = %s AND c.status = 'connected'
-                """, (credential_name,))
-            
-            elif email:
-                cur.execute("""
-                    SELECT c.id, c.provider, c.client_id, c.encrypted_client_secret,
-                           c.token_url, ct.encrypted_access_token, ct.encrypted_refresh_token,
-                           ct.expires_at, c.scopes
-                    FROM auth.credentials c
-                    LEFT JOIN auth.credential_tokens ct ON c.id = ct.credential_id
-                    WHERE c.connected_email = %s AND c.status = 'connected'
-                """, (email,))
-            
-            elif external_account_id:
-                cur.execute("""
-                    SELECT c.id, c.provider, c.client_id, c.encrypted_client_secret,
-                           c.token_url, ct.encrypted_access_token, ct.encrypted_refresh_token,
-                           ct.expires_at, c.scopes
-                    FROM auth.credentials c
-                    LEFT JOIN auth.credential_tokens ct ON c.id = ct.credential_id
-                    WHERE c.external_account_id = %s AND c.status = 'connected'
-                """, (external_account_id,))
+    # Only the first provided identifier is used (id, name, email, external id)
+    lookup = {"id": None, "name": None, "email": None, "ext": None}
+    if credential_id:
+        try:
+            lookup["id"] = UUID(credential_id)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid credential_id format")
+    elif credential_name:
+        lookup["name"] = credential_name
+    elif email:
+        lookup["email"] = email
+    else:
+        lookup["ext"] = external_account_id
+    
+    if body.get("metadata_only"):
+        async with async_pool.connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(CREDENTIAL_TOKEN_METADATA_SQL, lookup, prepare=True, binary=True)
+                row = await cur.fetchone()
+        if not row:
+            raise HTTPException(status_code=404, detail="Connected credential not found")
+        return {
+            "expires_at": int(row['expires_at'].timestamp()) if row['expires_at'] else None,
+            "credential_id": str(row['id']),
+            "provider": row['provider']
+        }
+    
+    # One pooled connection serves the lookup and, if needed, the refresh
+    # write, instead of checking out a second connection after the HTTP call
+    async with async_pool.connection() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(CREDENTIAL_TOKEN_SQL, lookup, prepare=True, binary=True)
             
-            row = cur.fetchone()
+            row = await cur.fetchone()
             
             if not row:
                 raise HTTPException(status_code=404, detail="Connected credential not found")
@@ -318,61 +355,49 @@ async def get_credential_token_internal(request: Request) -> Dict[str, Any]:
             cred_id = row['id']
             provider = row['provider']
             client_id = row['client_id']
-            client_secret = decrypt_token(row['encrypted_client_secret'])
+            encrypted_client_secret = row['encrypted_client_secret']
             token_url = row['token_url']
             encrypted_access = row['encrypted_access_token']
             encrypted_refresh = row['encrypted_refresh_token']
             expires_at = row['expires_at']
-            scopes = row['scopes']
-    
-    # Check if we have tokens
-    if not encrypted_access:
-        raise HTTPException(status_code=404, detail="No tokens found for this credential")
-    
-    # Decrypt access token
-    access_token = decrypt_token(encrypted_access)
-    
-    # Check if token is expired (with 5-minute buffer)
-    now = datetime.now(timezone.utc)
-    if expires_at and (expires_at - now).total_seconds() < 300:
-        # Token expired or expiring soon, refresh it
-        if not encrypted_refresh:
-            raise HTTPException(status_code=401, detail="Token expired and no refresh token available")
-        
-        refresh_token = decrypt_token(encrypted_refresh)
-        
-        # Refresh the token
-        new_tokens = await refresh_access_token(
-            refresh_token=refresh_token,
-            client_id=client_id,
-            client_secret=client_secret,
-            token_url=token_url
-        )
-        
-        # Update stored tokens
-        with get_db_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute("""
-                    UPDATE auth.credential_tokens
-                    SET 
-                        encrypted_access_token = %s,
-                        expires_at = now() + interval '1 hour' * %s,
-                        last_refreshed_at = now()
-                    WHERE credential_id = %s
-                    RETURNING expires_at
-                """, (
+            
+            # Check if we have tokens
+            if not encrypted_access:
+                raise HTTPException(status_code=404, detail="No tokens found for this credential")
+            
+            # Decrypt access token
+            access_token = decrypt_token(encrypted_access)
+            
+            # Token expired or within 5 minutes of expiry (judged by the DB clock)
+            if row['needs_refresh']:
+                # Token expired or expiring soon, refresh it
+                if not encrypted_refresh:
+                    raise HTTPException(status_code=401, detail="Token expired and no refresh token available")
+                
+                refresh_token = decrypt_token(encrypted_refresh)
+                
+                # Refresh the token (the client secret is only needed here)
+                new_tokens = await refresh_access_token(
+                    refresh_token=refresh_token,
+                    client_id=client_id,
+                    client_secret=_decrypt_client_secret(encrypted_client_secret),
+                    token_url=token_url
+                )
+                
+                # Update stored tokens on the same connection
+                await cur.execute(REFRESH_TOKEN_SQL, (
                     encrypt_token(new_tokens["access_token"]),
                     new_tokens.get("expires_in", 3600) / 3600.0,
                     cred_id
-                ))
+                ), prepare=True)
                 
-                row = cur.fetchone()
+                row = await cur.fetchone()
                 # psycopg3 Row object - access by column name or convert to tuple
                 new_expires_at = row['expires_at'] if row else None
-                conn.commit()
-        
-        access_token = new_tokens["access_token"]
-        expires_at = new_expires_at
+                await conn.commit()
+                
+                access_token = new_tokens["access_token"]
+                expires_at = new_expires_at
     
     # Convert expires_at to Unix timestamp for easier client handling
     expires_timestamp = None
@@ -393,6 +418,44 @@ async def get_credential_token_internal(request: Request) -> Dict[str, Any]:
 
 
 # Helper functions
+@lru_cache(maxsize=256)
+def _decrypt_client_secret(encrypted_client_secret: str) -> str:
+    """Decrypt a credential's client secret, memoized by ciphertext.
+    
+    Client secrets rarely change; keying on the stored ciphertext means an
+    updated secret (new ciphertext) simply misses the cache.
+    """
+    return decrypt_token(encrypted_client_secret)
+
+
+def _identity_from_id_token(
+    provider: str,
+    id_token: Optional[str]
+) -> Optional[Tuple[str, str, str]]:
+    """Read (external_account_id, email, display_name) from an OIDC id_token.
+    
+    The token comes straight from the provider's token endpoint over TLS, so
+    its claims are read without signature verification (OIDC Core 3.1.3.7).
+    Claims are mapped to the same values the user-info endpoints return:
+    MS365 oid / preferred_username / name, Google sub / email / name.
+    
+    Returns:
+        The identity tuple, or None if there is no id_token or a field is missing
+    """
+    if not id_token:
+        return None
+    try:
+        claims = pyjwt.decode(id_token, options={"verify_signature": False})
+    except pyjwt.InvalidTokenError:
+        return None
+    
+    handlers = _PROVIDERS.get(provider)
+    if handlers is None:
+        return None
+    identity = handlers.id_token_identity(claims)
+    return identity if all(identity) else None
+
+
 async def exchange_code_for_tokens(
     code: str,
     client_id: str,
@@ -401,26 +464,25 @@ async def exchange_code_for_tokens(
     token_url: str
 ) -> Dict[str, Any]:
     """Exchange authorization code for access and refresh tokens."""
-    async with httpx.AsyncClient() as client:
-        response = await client.post(
-            token_url,
-            data={
-                "grant_type": "authorization_code",
-                "code": code,
-                "client_id": client_id,
-                "client_secret": client_secret,
-                "redirect_uri": redirect_uri
-            },
-            headers={"Content-Type": "application/x-www-form-urlencoded"}
+    response = await get_http_client().post(
+        token_url,
+        data={
+            "grant_type": "authorization_code",
+            "code": code,
+            "client_id": client_id,
+            "client_secret": client_secret,
+            "redirect_uri": redirect_uri
+        },
+        headers={"Content-Type": "application/x-www-form-urlencoded"}
+    )
+    
+    if response.status_code != 200:
+        raise HTTPException(
+            status_code=502,
+            detail=f"Token exchange failed: {response.text}"
         )
-        
-        if response.status_code != 200:
-            raise HTTPException(
-                status_code=502,
-                detail=f"Token exchange failed: {response.text}"
-            )
-        
-        return response.json()
+    
+    return from_json(response.content)
 
 
 async def refresh_access_token(
@@ -430,56 +492,83 @@ async def refresh_access_token(
     token_url: str
 ) -> Dict[str, Any]:
     """Refresh an expired access token."""
-    async with httpx.AsyncClient() as client:
-        response = await client.post(
-            token_url,
-            data={
-                "grant_type": "refresh_token",
-                "refresh_token": refresh_token,
-                "client_id": client_id,
-                "client_secret": client_secret
-            },
-            headers={"Content-Type": "application/x-www-form-urlencoded"}
+    response = await get_http_client().post(
+        token_url,
+        data={
+            "grant_type": "refresh_token",
+            "refresh_token": refresh_token,
+            "client_id": client_id,
+            "client_secret": client_secret
+        },
+        headers={"Content-Type": "application/x-www-form-urlencoded"}
+    )
+    
+    if response.status_code != 200:
+        raise HTTPException(
+            status_code=502,
+            detail=f"Token refresh failed: {response.text}"
         )
-        
-        if response.status_code != 200:
-            raise HTTPException(
-                status_code=502,
-                detail=f"Token refresh failed: {response.text}"
-            )
-        
-        return response.json()
+    
+    return from_json(response.content)
 
 
 async def get_ms365_user_info(access_token: str) -> Dict[str, Any]:
     """Get user info from Microsoft Graph API."""
-    async with httpx.AsyncClient() as client:
-        response = await client.get(
-            "https://graph.microsoft.com/v1.0/me",
-            headers={"Authorization": f"Bearer {access_token}"}
+    response = await get_http_client().get(
+        "https://graph.microsoft.com/v1.0/me",
+        headers={"Authorization": f"Bearer {access_token}"}
+    )
+    
+    if response.status_code != 200:
+        raise HTTPException(
+            status_code=502,
+            detail=f"Failed to get user info: {response.text}"
         )
-        
-        if response.status_code != 200:
-            raise HTTPException(
-                status_code=502,
-                detail=f"Failed to get user info: {response.text}"
-            )
-        
-        return response.json()
+    
+    return from_json(response.content)
 
 
 async def get_google_user_info(access_token: str) -> Dict[str, Any]:
     """Get user info from Google API."""
-    async with httpx.AsyncClient() as client:
-        response = await client.get(
-            "https://www.googleapis.com/oauth2/v3/userinfo",
-            headers={"Authorization": f"Bearer {access_token}"}
+    response = await get_http_client().get(
+        "https://www.googleapis.com/oauth2/v3/userinfo",
+        headers={"Authorization": f"Bearer {access_token}"}
+    )
+    
+    if response.status_code != 200:
+        raise HTTPException(
+            status_code=502,
+            detail=f"Failed to get user info: {response.text}"
         )
-        
-        if response.status_code != 200:
-            raise HTTPException(
-                status_code=502,
-                detail=f"Failed to get user info: {response.text}"
-            )
-        
-        return response.json()
+    
+    return from_json(response.content)
+
+
+# Per-provider identity handling, dispatched by credential provider.
+# Identity tuples are (external_account_id, email, display_name).
+class _ProviderHandlers(NamedTuple):
+    fetch_user_info: Callable[[str], Awaitable[Dict[str, Any]]]
+    user_info_identity: Callable[[Dict[str, Any]], Tuple[Any, Any, Any]]
+    id_token_identity: Callable[[Dict[str, Any]], Tuple[Any, Any, Any]]
+
+
+_PROVIDERS: Dict[str, _ProviderHandlers] = {
+    "ms365": _ProviderHandlers(
+        fetch_user_info=get_ms365_user_info,
+        user_info_identity=lambda info: (
+            info.get("id"),
+            info.get("userPrincipalName") or info.get("mail"),
+            info.get("displayName"),
+        ),
+        id_token_identity=lambda claims: (
+            claims.get("oid"),
+            claims.get("preferred_username") or claims.get("email"),
+            claims.get("name"),
+        ),
+    ),
+    "google_workspace": _ProviderHandlers(
+        fetch_user_info=get_google_user_info,
+        user_info_identity=lambda info: (info.get("sub"), info.get("email"), info.get("name")),
+        id_token_identity=lambda claims: (claims.get("sub"), claims.get("email"), claims.get("name")),
+    ),
+}
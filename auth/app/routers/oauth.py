@@ -1,8 +1,10 @@
 """OAuth routes for external provider authentication."""
+import hmac
 from fastapi import APIRouter, HTTPException, Request, Depends
 from fastapi.responses import RedirectResponse
 from typing import Dict, Any
 from uuid import UUID
+from .. import envs
 from ..services import oauth
 from ..services.jwt import verify_jwt
 
@@ -10,6 +12,10 @@ from ..services.jwt import verify_jwt
 router = APIRouter(prefix="/auth/oauth", tags=["oauth"])
 
 
+# Expected X-Service-Token value, encoded once (None when SERVICE_SECRET is unset)
+_SERVICE_SECRET = envs.SERVICE_SECRET.encode() if envs.SERVICE_SECRET else None
+
+
 @router.get("/ms365/authorize")
 async def ms365_authorize(request: Request):
     """
@@ -26,7 +32,7 @@ async def ms365_authorize(request: Request):
     token = auth_header.replace("Bearer ", "")
     try:
         payload = verify_jwt(token)
-        user_id = UUID(payload["userId"])
+        user_id = payload["_userId_uuid"]
     except Exception as e:
         raise HTTPException(status_code=401, detail=f"Invalid token: {str(e)}")
     
@@ -96,13 +102,13 @@ async def get_tenant_token_internal(request: Request) -> Dict[str, Any]:
     Requires X-Service-Token header for authentication.
     Returns valid access token, refreshing if needed.
     """
-    import os
-    
     # Validate service token
     service_token = request.headers.get("X-Service-Token")
-    expected_token = os.environ.get("SERVICE_SECRET")
     
-    if not service_token or service_token != expected_token:
+    # Constant-time compare so response timing does not leak the secret
+    if not service_token or not _SERVICE_SECRET or not hmac.compare_digest(
+        service_token.encode(), _SERVICE_SECRET
+    ):
         raise HTTPException(status_code=401, detail="Invalid service token")
     
     # Get tenant_id from request body
@@ -118,19 +124,8 @@ async def get_tenant_token_internal(request: Request) -> Dict[str, Any]:
         raise HTTPException(status_code=400, detail="Invalid tenant_id format")
     
     try:
-        # Get valid token (auto-refreshes if needed)
-        access_token = await oauth.get_tenant_token(tenant_id)
-        
-        # Get token expiry info
-        from ..services.database import get_db_connection
-        with get_db_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(
-                    "SELECT expires_at FROM auth.tenant_tokens WHERE tenant_id = %s",
-                    (tenant_id,)
-                )
-                row = cur.fetchone()
-                expires_at = row['expires_at'] if row else None
+        # Get valid token and its expiry (auto-refreshes if needed)
+        access_token, expires_at = await oauth.get_tenant_token_with_expiry(tenant_id)
         
         return {
             "access_token": access_token,
@@ -0,0 +1,58 @@
+"""Cached per-credential OAuth configuration for the authorize flow."""
+from typing import Any, Dict, Optional
+from uuid import UUID
+from .cache import TTLCache
+from .database import async_pool
+
+
+AUTHORIZE_CREDENTIAL_SQL = """
+    SELECT
+        id, provider, client_id, redirect_uri,
+        authorization_url, scopes
+    FROM auth.credentials
+    WHERE id = %s
+"""
+
+# credential id -> authorize config. Provider settings rarely change after
+# setup, so repeat /authorize calls skip the database; admin edits and
+# completed connections drop the entry explicitly.
+_authorize_configs = TTLCache(maxsize=512, ttl=60)
+
+
+async def get_authorize_config(credential_id: UUID) -> Optional[Dict[str, Any]]:
+    """Get the fields needed to build a credential's authorization URL.
+
+    Args:
+        credential_id: Credential UUID
+
+    Returns:
+        Dict with id, provider, client_id, redirect_uri, authorization_url
+        and scopes, or None if the credential does not exist
+    """
+    config = _authorize_configs.get(credential_id)
+    if config is not None:
+        return config
+
+    async with async_pool.connection() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(AUTHORIZE_CREDENTIAL_SQL, (credential_id,), prepare=True)
+            row = await cur.fetchone()
+
+    if not row:
+        return None
+
+    config = {
+        "id": str(row['id']),
+        "provider": row['provider'],
+        "client_id": row['client_id'],
+        "redirect_uri": row['redirect_uri'],
+        "authorization_url": row['authorization_url'],
+        "scopes": row['scopes']
+    }
+    _authorize_configs.set(credential_id, config)
+    return config
+
+
+def invalidate_credential_config(credential_id: UUID) -> None:
+    """Drop a credential's cached config after it is changed or deleted."""
+    _authorize_configs.pop(credential_id)
@@ -1,27 +1,123 @@
 """Database connection and schema management."""
-import os
 from contextlib import contextmanager
 import psycopg
 from psycopg.rows import dict_row
+from psycopg_pool import AsyncConnectionPool, ConnectionPool
+from .. import envs
 
 
 def get_database_url() -> str:
     """Get database URL from environment."""
-    dsn = os.environ.get("DATABASE_URL")
+    dsn = envs.DATABASE_URL
     if not dsn:
         raise ValueError("DATABASE_URL environment variable not set")
     return dsn
 
 
+# Process-wide connection pool, opened/closed by the FastAPI lifespan.
+# Connections hand out dict rows like get_db_connection(); callers that
+# want tuples can pass row_factory to conn.cursor().
+# prepare_threshold=0 server-side prepares every statement on its first
+# execution per connection, so the repeated login/OTP queries skip
+# parse/plan afterwards. Multi-statement scripts (SCHEMA_DDL, migrations)
+# cannot be prepared and run on their own unpooled connections.
+pool = ConnectionPool(
+    conninfo=envs.DATABASE_URL or "",
+    min_size=envs.DB_POOL_MIN_SIZE,
+    max_size=envs.DB_POOL_MAX_SIZE,
+    kwargs={"connect_timeout": 3, "row_factory": dict_row, "prepare_threshold": 0},
+    # Ping connections on checkout so a backend dropped while idle (server
+    # restart, idle timeout) is replaced instead of failing the request
+    check=ConnectionPool.check_connection,
+    # Recycle connections hourly so server-side state and stale sockets
+    # do not accumulate on long-lived pooled connections
+    max_lifetime=3600,
+    open=False,
+)
+
+
+# Async counterpart for handlers declared with async def, so they can wait
+# on the database without occupying a threadpool worker.
+async_pool = AsyncConnectionPool(
+    conninfo=envs.DATABASE_URL or "",
+    min_size=envs.DB_ASYNC_POOL_MIN_SIZE,
+    max_size=envs.DB_ASYNC_POOL_MAX_SIZE,
+    kwargs={"connect_timeout": 3, "row_factory": dict_row, "prepare_threshold": 0},
+    check=AsyncConnectionPool.check_connection,
+    open=False,
+)
+
+
+async def open_pool() -> None:
+    """Open the shared pools (no-op when DATABASE_URL is not set)."""
+    if envs.DATABASE_URL:
+        pool.open()
+        await async_pool.open()
+
+
+async def close_pool() -> None:
+    """Close the shared pools and their connections."""
+    pool.close()
+    await async_pool.close()
+
+
 @contextmanager
 def get_db_connection():
-    """Get a database connection context manager."""
-    dsn = get_database_url()
-    conn = psycopg.connect(dsn, row_factory=dict_row)
-    try:
+    """Get a database connection context manager.
+    
+    Borrows a connection from the shared pool instead of opening a new one.
+    On exit the pending transaction is committed (or rolled back if the
+    block raised) and the connection goes back to the pool.
+    """
+    if pool.closed:
+        # Used outside the app lifespan (scripts, one-off tooling)
+        get_database_url()
+        pool.open()
+    with pool.connection() as conn:
         yield conn
-    finally:
-        conn.close()
+
+
+# Legacy bootstrap schema; sent as one multi-statement query (no parameters,
+# so psycopg uses the simple protocol and Postgres runs it in one round trip
+# and one implicit transaction)
+SCHEMA_DDL = """
+    -- Create auth schema if not exists
+    CREATE SCHEMA IF NOT EXISTS auth;
+
+    -- Create users table
+    CREATE TABLE IF NOT EXISTS auth.users (
+        id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+        email VARCHAR(255) UNIQUE NOT NULL,
+        phone VARCHAR(50),
+        otp_preference VARCHAR(10) CHECK (otp_preference IN ('sms', 'email')),
+        created_at TIMESTAMPTZ DEFAULT NOW(),
+        last_login_at TIMESTAMPTZ,
+        CONSTRAINT email_lowercase CHECK (email = LOWER(email))
+    );
+
+    -- Create indexes
+    CREATE INDEX IF NOT EXISTS idx_users_email 
+    ON auth.users(email);
+
+    CREATE INDEX IF NOT EXISTS idx_users_created_at 
+    ON auth.users(created_at DESC);
+
+    -- Create OTP storage table
+    CREATE TABLE IF NOT EXISTS auth.otp_storage (
+        email VARCHAR(255) PRIMARY KEY,
+        otp_hash VARCHAR(255) NOT NULL,
+        attempts INTEGER DEFAULT 0,
+        expires_at TIMESTAMPTZ NOT NULL,
+        created_at TIMESTAMPTZ DEFAULT NOW()
+    );
+
+    -- Create rate limit table
+    CREATE TABLE IF NOT EXISTS auth.rate_limit (
+        email VARCHAR(255) PRIMARY KEY,
+        request_count INTEGER DEFAULT 0,
+        window_start TIMESTAMPTZ NOT NULL
+    );
+"""
 
 
 def init_database():
@@ -30,51 +126,6 @@ def init_database():
     
     with psycopg.connect(dsn, autocommit=True) as conn:
         with conn.cursor() as cur:
-            # Create auth schema if not exists
-            cur.execute("CREATE SCHEMA IF NOT EXISTS auth")
-            
-            # Create users table
-            cur.execute("""
-                CREATE TABLE IF NOT EXISTS auth.users (
-                    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
-                    email VARCHAR(255) UNIQUE NOT NULL,
-                    phone VARCHAR(50),
-                    otp_preference VARCHAR(10) CHECK (otp_preference IN ('sms', 'email')),
-                    created_at TIMESTAMPTZ DEFAULT NOW(),
-                    last_login_at TIMESTAMPTZ,
-                    CONSTRAINT email_lowercase CHECK (email = LOWER(email))
-                )
-            """)
-            
-            # Create indexes
-            cur.execute("""
-                CREATE INDEX IF NOT EXISTS idx_users_email 
-                ON auth.users(email)
-            """)
-            
-            cur.execute("""
-                CREATE INDEX IF NOT EXISTS idx_users_created_at 
-                ON auth.users(created_at DESC)
-            """)
-            
-            # Create OTP storage table
-            cur.execute("""
-                CREATE TABLE IF NOT EXISTS auth.otp_storage (
-                    email VARCHAR(255) PRIMARY KEY,
-                    otp_hash VARCHAR(255) NOT NULL,
-                    attempts INTEGER DEFAULT 0,
-                    expires_at TIMESTAMPTZ NOT NULL,
-                    created_at TIMESTAMPTZ DEFAULT NOW()
-                )
-            """)
-            
-            # Create rate limit table
-            cur.execute("""
-                CREATE TABLE IF NOT EXISTS auth.rate_limit (
-                    email VARCHAR(255) PRIMARY KEY,
-                    request_count INTEGER DEFAULT 0,
-                    window_start TIMESTAMPTZ NOT NULL
-                )
-            """)
+            cur.execute(SCHEMA_DDL)
             
             print("Auth database schema initialized successfully")
@@ -1,9 +1,13 @@
 """Email delivery service using SMTP."""
+import atexit
 import os
+import queue
 import smtplib
+from email import charset
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from typing import Optional
+from functools import lru_cache
+from typing import Optional, Tuple
 
 
 def get_smtp_config() -> Optional[dict]:
@@ -26,33 +30,8 @@ def get_smtp_config() -> Optional[dict]:
     }
 
 
-def is_smtp_configured() -> bool:
-    """Check if SMTP is configured."""
-    return get_smtp_config() is not None
-
-
-def send_otp_email(email: str, otp: str) -> bool:
-    """Send OTP via email.
-    
-    Args:
-        email: Recipient email address
-        otp: 6-digit OTP code
-    
-    Returns:
-        True if sent successfully, False otherwise
-    """
-    config = get_smtp_config()
-    if not config:
-        raise ValueError("SMTP not configured. Set SMTP_HOST, SMTP_USER, and SMTP_PASS")
-    
-    # Create message
-    msg = MIMEMultipart("alternative")
-    msg["Subject"] = "Your Flovify Verification Code"
-    msg["From"] = config["from_email"]
-    msg["To"] = email
-    
-    # Plain text version
-    text = f"""Your Flovify verification code is: {otp}
+# Message bodies, split once around the code so each send is a concatenation
+_TEXT_TEMPLATE = """Your Flovify verification code is: {otp}
 
 This code expires in 5 minutes.
 
@@ -60,45 +39,44 @@ Never share this code with anyone.
 
 If you didn't request this code, please ignore this email.
 """
-    
-    # HTML version
-    html = f"""
+
+_HTML_TEMPLATE = """
 <!DOCTYPE html>
 <html>
 <head>
     <style>
-        body {{
+        body {
             font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, 'Helvetica Neue', Arial, sans-serif;
             line-height: 1.6;
             color: #333;
             max-width: 600px;
             margin: 0 auto;
             padding: 20px;
-        }}
-        .container {{
+        }
+        .container {
             background: #ffffff;
             border-radius: 8px;
             padding: 40px;
             box-shadow: 0 2px 4px rgba(0,0,0,0.1);
-        }}
-        .header {{
+        }
+        .header {
             text-align: center;
             margin-bottom: 30px;
-        }}
-        .header h1 {{
+        }
+        .header h1 {
             color: #5865f2;
             margin: 0;
             font-size: 28px;
-        }}
-        .content {{
+        }
+        .content {
             text-align: center;
-        }}
-        .content h2 {{
+        }
+        .content h2 {
             color: #333;
             margin: 0 0 20px 0;
             font-size: 24px;
-        }}
-        .otp-code {{
+        }
+        .otp-code {
             background: #f0f2f5;
             border: 2px solid #5865f2;
             border-radius: 8px;
@@ -109,20 +87,20 @@ If you didn't request this code, please ignore this email.
             color: #5865f2;
             margin: 30px 0;
             font-family: 'Courier New', monospace;
-        }}
-        .warning {{
+        }
+        .warning {
             color: #e74c3c;
             font-weight: 600;
             margin-top: 20px;
-        }}
-        .footer {{
+        }
+        .footer {
             text-align: center;
             margin-top: 30px;
             padding-top: 20px;
             border-top: 1px solid #e0e0e0;
             color: #666;
             font-size: 14px;
-        }}
+        }
     </style>
 </head>
 <body>
@@ -144,19 +122,141 @@ If you didn't request this code, please ignore this email.
 </body>
 </html>
 """
+
+_TEXT_PREFIX, _TEXT_SUFFIX = _TEXT_TEMPLATE.split("{otp}")
+_HTML_PREFIX, _HTML_SUFFIX = _HTML_TEMPLATE.split("{otp}")
+
+# Placeholders for the per-message values in the serialized template
+_TO_SENTINEL = "recipient.placeholder@invalid"
+_OTP_SENTINEL = "XOTPCODEX"
+
+# UTF-8 with quoted-printable bodies, so ASCII text (and the code) stays
+# literal in the encoded bytes instead of being base64-scrambled
+_UTF8_QP = charset.Charset("utf-8")
+_UTF8_QP.body_encoding = charset.QP
+
+
+@lru_cache(maxsize=4)
+def _otp_message_template(from_email: str) -> Tuple[bytes, bytes, bytes, bytes]:
+    """Serialize the OTP message once per sender.
+    
+    Returns:
+        Byte chunks to interleave as chunk0 + to + chunk1 + otp + chunk2 + otp + chunk3
+    """
+    msg = MIMEMultipart("alternative")
+    msg["Subject"] = "Your Flovify Verification Code"
+    msg["From"] = from_email
+    msg["To"] = _TO_SENTINEL
+    msg.attach(MIMEText(_TEXT_PREFIX + _OTP_SENTINEL + _TEXT_SUFFIX, "plain"))
+    msg.attach(MIMEText(_HTML_PREFIX + _OTP_SENTINEL + _HTML_SUFFIX, "html", _UTF8_QP))
+    
+    # Same CRLF line endings SMTP.send_message would produce
+    raw = msg.as_bytes(policy=msg.policy.clone(linesep="\r\n"))
+    head, body = raw.split(_TO_SENTINEL.encode())
+    text_head, html_head, tail = body.split(_OTP_SENTINEL.encode())
+    return head, text_head, html_head, tail
+
+
+# Idle authenticated SMTP sessions, reused across sends so each OTP skips
+# the TCP connect, STARTTLS and AUTH exchanges. A session is retired after
+# _SMTP_MAX_SENDS messages so no single connection lives forever.
+_SMTP_POOL_SIZE = 5
+_SMTP_MAX_SENDS = 100
+_smtp_pool: "queue.LifoQueue[tuple[smtplib.SMTP, int]]" = queue.LifoQueue(maxsize=_SMTP_POOL_SIZE)
+
+
+def _close_smtp(server: smtplib.SMTP) -> None:
+    """Close an SMTP session, ignoring errors from a dead connection."""
+    try:
+        server.quit()
+    except (smtplib.SMTPException, OSError):
+        server.close()
+
+
+def _get_smtp(config: dict) -> tuple[smtplib.SMTP, int]:
+    """Take a live session from the pool, or open and log in a new one.
+    
+    Returns:
+        (server, sends) where sends counts messages already sent on it
+    """
+    while True:
+        try:
+            server, sends = _smtp_pool.get_nowait()
+        except queue.Empty:
+            break
+        try:
+            # Health check: the server may have dropped an idle session
+            server.noop()
+            return server, sends
+        except (smtplib.SMTPException, OSError):
+            server.close()
+    
+    server = smtplib.SMTP(config["host"], config["port"])
+    try:
+        server.starttls()
+        server.login(config["user"], config["password"])
+    except Exception:
+        server.close()
+        raise
+    return server, 0
+
+
+def _release_smtp(server: smtplib.SMTP, sends: int) -> None:
+    """Return a session to the pool, or close it if retired or the pool is full."""
+    if sends >= _SMTP_MAX_SENDS:
+        _close_smtp(server)
+        return
+    try:
+        _smtp_pool.put_nowait((server, sends))
+    except queue.Full:
+        _close_smtp(server)
+
+
+@atexit.register
+def _drain_smtp_pool() -> None:
+    """Log out of all pooled sessions at interpreter exit."""
+    while True:
+        try:
+            server, _ = _smtp_pool.get_nowait()
+        except queue.Empty:
+            return
+        _close_smtp(server)
+
+
+def is_smtp_configured() -> bool:
+    """Check if SMTP is configured."""
+    return get_smtp_config() is not None
+
+
+def send_otp_email(email: str, otp: str) -> bool:
+    """Send OTP via email.
+    
+    Args:
+        email: Recipient email address
+        otp: 6-digit OTP code
+    
+    Returns:
+        True if sent successfully, False otherwise
+    """
+    config = get_smtp_config()
+    if not config:
+        raise ValueError("SMTP not configured. Set SMTP_HOST, SMTP_USER, and SMTP_PASS")
     
-    # Attach both versions
-    part1 = MIMEText(text, "plain")
-    part2 = MIMEText(html, "html")
-    msg.attach(part1)
-    msg.attach(part2)
+    # Only the recipient and the code vary between messages: splice them
+    # into the pre-serialized MIME bytes (plain and HTML parts)
+    head, text_head, html_head, tail = _otp_message_template(config["from_email"])
+    code = otp.encode()
+    message = b"".join((head, email.encode(), text_head, code, html_head, code, tail))
     
     try:
-        # Connect and send
-        with smtplib.SMTP(config["host"], config["port"]) as server:
-            server.starttls()
-            server.login(config["user"], config["password"])
-            server.send_message(msg)
+        # Send on a pooled session; a failed session is dropped, not reused
+        server, sends = _get_smtp(config)
+        try:
+            server.sendmail(config["from_email"], [email], message)
+        except Exception:
+            server.close()
+            raise
+        _release_smtp(server, sends + 1)
         
         return True
     except Exception as e:
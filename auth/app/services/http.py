@@ -0,0 +1,31 @@
+"""Shared outbound HTTP client for OAuth provider calls."""
+from typing import Optional
+import httpx
+
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Get the process-wide AsyncClient, creating it on first use.
+
+    Reusing one client keeps TCP/TLS connections to the identity providers
+    (login.microsoftonline.com, graph.microsoft.com, Google) alive between
+    calls and lets HTTP/2 multiplex requests to the same host.
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            http2=True,
+            timeout=10.0,
+            limits=httpx.Limits(max_keepalive_connections=50),
+        )
+    return _client
+
+
+async def close_http_client() -> None:
+    """Close the shared client (called from the FastAPI lifespan)."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
@@ -1,20 +1,46 @@
 """JWT token generation and verification."""
+import base64
+import binascii
+import json
 import os
-from datetime import datetime, timedelta
+import time
+from typing import Optional
+from uuid import UUID
 import jwt
+from .cache import TTLCache
+
+ALGORITHM = "HS256"
+TOKEN_TTL_SECONDS = 7 * 24 * 60 * 60
+
+# Recently verified tokens -> decoded payload. Admin UIs poll with the same
+# token, so repeat requests skip the decode and signature check.
+_verified_tokens = TTLCache(maxsize=1024, ttl=60)
+
+# Recently issued tokens keyed by (user_id, email, role). A token is valid
+# for days, so re-issuing within the hour returns the same string instead
+# of signing a new one.
+_issued_tokens = TTLCache(maxsize=4096, ttl=60 * 60)
+
+_secret: Optional[str] = None
 
 
 def get_jwt_secret() -> str:
-    """Get JWT secret from environment."""
-    secret = os.environ.get("JWT_SECRET")
-    if not secret:
-        raise ValueError("JWT_SECRET environment variable not set")
-    return secret
+    """Get JWT secret from environment (read once, then cached)."""
+    global _secret
+    if _secret is None:
+        secret = os.environ.get("JWT_SECRET")
+        if not secret:
+            raise ValueError("JWT_SECRET environment variable not set")
+        _secret = secret
+    return _secret
 
 
 def generate_jwt(user_id: str, email: str, role: str = 'user') -> str:
     """Generate JWT token for user.
     
+    A token issued for the same user, email and role within the last hour
+    is returned as-is rather than signed again.
+    
     Args:
         user_id: User UUID as string
         email: User email address
@@ -23,32 +49,81 @@ def generate_jwt(user_id: str, email: str, role: str = 'user') -> str:
     Returns:
         JWT token string
     """
+    key = (user_id, email, role)
+    token = _issued_tokens.get(key)
+    if token is not None:
+        return token
+    
     secret = get_jwt_secret()
-    expiry = datetime.utcnow() + timedelta(days=7)
+    # NumericDate claims are integer seconds since the epoch (UTC)
+    now = int(time.time())
     
     payload = {
         "userId": user_id,
         "email": email,
         "role": role,
-        "exp": expiry,
-        "iat": datetime.utcnow(),
+        "exp": now + TOKEN_TTL_SECONDS,
+        "iat": now,
     }
     
-    return jwt.encode(payload, secret, algorithm="HS256")
+    token = jwt.encode(payload, secret, algorithm=ALGORITHM)
+    _issued_tokens.set(key, token)
+    return token
 
 
 def verify_jwt(token: str) -> dict:
     """Verify and decode JWT token.
     
+    Successful verifications are cached for up to a minute (never past
+    the token's exp), so repeat calls with the same token are a dict lookup.
+    
     Args:
         token: JWT token string
     
     Returns:
-        Decoded payload dictionary
+        Decoded payload dictionary; when the userId claim is a valid UUID it
+        is also provided parsed as "_userId_uuid"
     
     Raises:
         jwt.ExpiredSignatureError: Token has expired
         jwt.InvalidTokenError: Token is invalid
     """
+    now = time.time()
+    payload = _verified_tokens.get(token)
+    if payload is not None and payload["exp"] > now:
+        return dict(payload)
+    
     secret = get_jwt_secret()
-    return jwt.decode(token, secret, algorithms=["HS256"])
+    payload = jwt.decode(token, secret, algorithms=[ALGORITHM])
+    # Parse the user id once per token rather than in every handler
+    try:
+        payload["_userId_uuid"] = UUID(payload["userId"])
+    except (KeyError, TypeError, ValueError):
+        pass
+    if "exp" in payload:
+        # Never serve a cached payload past the token's own expiry
+        _verified_tokens.set(token, payload, ttl=payload["exp"] - now)
+    return dict(payload)
+
+
+def check_token_header(token: str) -> None:
+    """Cheaply reject tokens that can never verify, before any signature check.
+    
+    Decodes only the header segment and checks its alg, so malformed or
+    foreign tokens (bot traffic) are rejected without HMAC work.
+    
+    Args:
+        token: JWT token string
+    
+    Raises:
+        jwt.InvalidTokenError: Token is not a JWT or uses an unexpected alg
+    """
+    header_segment, sep, _ = token.partition(".")
+    if not sep:
+        raise jwt.InvalidTokenError("Not enough segments")
+    try:
+        header = json.loads(base64.urlsafe_b64decode(header_segment + "=="))
+    except (binascii.Error, ValueError):
+        raise jwt.InvalidTokenError("Invalid header")
+    if not isinstance(header, dict) or header.get("alg") != ALGORITHM:
+        raise jwt.InvalidTokenError("Unexpected algorithm")
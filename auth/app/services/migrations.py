@@ -1,62 +1,142 @@
 """SQL migration runner for auth service."""
-import os
+import functools
+import logging
+import logging.handlers
+import sys
 from pathlib import Path
-import psycopg
+from psycopg_pool import ConnectionPool
+from .. import envs
+
+# Arbitrary application-wide key for pg_advisory_lock. Every worker process
+# runs the lifespan hook, so migrations are serialized on this lock.
+MIGRATION_LOCK_ID = 7_246_001
+
+MIGRATIONS_DIR = Path(__file__).parent.parent.parent / "migrations"
+
+# Startup progress lines are buffered and written to stderr in one batch at
+# the end of run_migrations (or immediately on an error).
+log = logging.getLogger("auth.migrations")
+log.setLevel(logging.INFO)
+log.propagate = False
+_log_handler = logging.handlers.MemoryHandler(
+    capacity=100,
+    flushLevel=logging.ERROR,
+    target=logging.StreamHandler(sys.stderr),
+)
+_log_handler.target.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+log.addHandler(_log_handler)
 
 
 def get_database_url() -> str:
     """Get database URL from environment."""
-    dsn = os.environ.get("DATABASE_URL")
+    dsn = envs.DATABASE_URL
     if not dsn:
         raise ValueError("DATABASE_URL environment variable not set")
     return dsn
 
 
+@functools.lru_cache(maxsize=1)
+def load_migrations() -> tuple[tuple[str, str], ...]:
+    """Return (filename, sql) for every migration file, in apply order.
+    
+    The files are baked into the image and never change while the process
+    runs, so the directory scan and reads happen once.
+    """
+    # Get all .sql files except templates and health checks
+    # Sort them to run in order (0000, 0001, 0002, etc.)
+    migration_files = sorted(
+        f for f in MIGRATIONS_DIR.glob("*.sql")
+        if not f.name.startswith("_") and not f.name.startswith("9999")
+    )
+    return tuple((f.name, f.read_text(encoding='utf-8')) for f in migration_files)
+
+
 def run_migrations():
     """Run all SQL migrations in order.
     
-    Simply executes migration files sequentially. Each migration file is
-    responsible for its own idempotency and history tracking.
+    Executes migration files sequentially, skipping those whose sequence
+    number is already recorded in auth.migration_history. Each migration
+    file is responsible for its own idempotency and history tracking.
     """
-    migrations_dir = Path(__file__).parent.parent.parent / "migrations"
-    
-    if not migrations_dir.exists():
-        print("No migrations directory found, skipping migrations")
+    try:
+        _apply_migrations()
+    finally:
+        _log_handler.flush()
+
+
+def _apply_migrations():
+    if not MIGRATIONS_DIR.exists():
+        log.info("No migrations directory found, skipping migrations")
         return
     
-    # Get all .sql files except templates and health checks
-    # Sort them to run in order (0000, 0001, 0002, etc.)
-    migration_files = sorted([
-        f for f in migrations_dir.glob("*.sql")
-        if not f.name.startswith("_") and not f.name.startswith("9999")
-    ])
+    migration_files = load_migrations()
     
     if not migration_files:
-        print("No migration files found")
+        log.info("No migration files found")
         return
     
-    print(f"Found {len(migration_files)} migration files")
+    log.info("Found %d migration files", len(migration_files))
     
     dsn = get_database_url()
     
-    with psycopg.connect(dsn, autocommit=False) as conn:
+    # Autocommit: each file is sent as one simple-query batch, which Postgres
+    # runs as a single implicit transaction (or honours the file's own
+    # BEGIN/COMMIT), so no separate COMMIT round trip is needed per file.
+    # A single-connection pool is used only for its connect retry with
+    # exponential backoff while the database is still starting up.
+    pool = ConnectionPool(
+        conninfo=dsn,
+        min_size=1,
+        max_size=1,
+        kwargs={"autocommit": True},
+        open=False,
+    )
+    try:
+        pool.open(wait=True, timeout=envs.MIGRATIONS_CONNECT_TIMEOUT)
+    except Exception as e:
+        pool.close()
+        raise RuntimeError(
+            f"Database not reachable after {envs.MIGRATIONS_CONNECT_TIMEOUT}s: {e}"
+        ) from e
+    
+    with pool, pool.connection() as conn:
         with conn.cursor() as cur:
+            # Only one process applies migrations at a time; others block here
+            # and then apply whatever is still pending. The session-level lock
+            # is released when the pool closes its connection on leaving this
+            # block. The history-table probe rides along with the lock:
+            # to_regclass returns NULL instead of raising on a fresh database.
+            cur.execute(
+                "SELECT pg_advisory_lock(%s), to_regclass('auth.migration_history') IS NOT NULL",
+                (MIGRATION_LOCK_ID,),
+            )
+            has_history = cur.fetchone()[1]
+            
+            # Files already recorded in migration_history are skipped, so a
+            # restart with no new migrations does no DDL at all
+            applied = set()
+            if has_history:
+                cur.execute("SELECT file_seq FROM auth.migration_history WHERE schema_name = 'auth'")
+                applied = {row[0] for row in cur.fetchall()}
+            
+            pending = [
+                (filename, sql) for filename, sql in migration_files
+                if int(filename.split("_", 1)[0]) not in applied
+            ]
+            if not pending:
+                log.info("Schema up to date, no migrations to apply")
+            
             # Apply each migration
-            for migration_file in migration_files:
-                filename = migration_file.name
-                
-                print(f"Applying migration: {filename}")
+            for filename, sql in pending:
+                log.info("Applying migration: %s", filename)
                 
                 try:
-                    sql = migration_file.read_text(encoding='utf-8')
                     cur.execute(sql)
-                    conn.commit()
                     
-                    print(f"✓ Successfully applied {filename}")
+                    log.info("✓ Successfully applied %s", filename)
                     
                 except Exception as e:
-                    print(f"✗ Failed to apply {filename}: {e}")
-                    conn.rollback()
+                    log.error("✗ Failed to apply %s: %s", filename, e)
                     raise
     
-    print("All migrations applied successfully")
+    log.info("All migrations applied successfully")
@@ -1,31 +1,47 @@
 """OAuth service for managing external provider authentication and tokens."""
 import os
 import base64
+import heapq
+import re
 import secrets
-from typing import Optional, Dict, Any
-from datetime import datetime, timedelta
+import time
+from functools import lru_cache
+from typing import Optional, Dict, Any, List, Tuple
+from datetime import datetime, timedelta, timezone
+from urllib.parse import quote, urlencode
 from uuid import UUID, uuid4
-import httpx
 from cryptography.fernet import Fernet
+from pydantic_core import from_json
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 from .database import get_db_connection
+from .cache import TTLCache
+from .http import get_http_client
 
 
 # Encryption setup
+# A URL-safe base64 encoding of 32 bytes, usable by Fernet as-is
+_FERNET_KEY_RE = re.compile(r"[A-Za-z0-9_-]{43}=")
+
+
+@lru_cache(maxsize=1)
 def _get_encryption_key() -> bytes:
-    """Get or derive encryption key from environment."""
+    """Get or derive encryption key from environment (computed once per process)."""
     key_str = os.environ.get("OAUTH_ENCRYPTION_KEY")
     if not key_str:
         raise ValueError("OAUTH_ENCRYPTION_KEY environment variable not set")
     
-    # If it's already a valid Fernet key (44 bytes base64), use it
-    try:
-        key_bytes = base64.urlsafe_b64decode(key_str)
-        if len(key_bytes) == 32:
-            return base64.urlsafe_b64encode(key_bytes)
-    except Exception:
-        pass
+    # If it's already a valid Fernet key (44 bytes base64), use it as-is
+    if _FERNET_KEY_RE.fullmatch(key_str):
+        return key_str.encode()
+    if len(key_str) == 44:
+        # Standard-alphabet base64 (e.g. openssl rand -base64 32): re-encode URL-safe
+        try:
+            key_bytes = base64.urlsafe_b64decode(key_str)
+            if len(key_bytes) == 32:
+                return base64.urlsafe_b64encode(key_bytes)
+        except Exception:
+            pass
     
     # Otherwise, derive a key from the provided string
     kdf = PBKDF2HMAC(
@@ -50,21 +66,43 @@ def _get_fernet() -> Fernet:
     return _FERNET
 
 
+def warm_encryption() -> None:
+    """Derive the encryption key ahead of the first request, if one is configured.
+    
+    The PBKDF2 derivation takes tens of milliseconds of CPU; running it at
+    startup keeps that off the first credential save or token lookup.
+    """
+    if os.environ.get("OAUTH_ENCRYPTION_KEY"):
+        _get_fernet()
+
+
+# Every Fernet token starts with version byte 0x80, i.e. "gA" in base64
+_FERNET_TOKEN_PREFIX = "gA"
+
+
 def encrypt_token(plaintext: str) -> str:
-    """Encrypt a token for storage."""
+    """Encrypt a token for storage.
+    
+    Fernet output is already URL-safe base64 text, so it is stored as-is.
+    """
     if not plaintext:
         return ""
     fernet = _get_fernet()
-    encrypted = fernet.encrypt(plaintext.encode())
-    return base64.urlsafe_b64encode(encrypted).decode()
+    return fernet.encrypt(plaintext.encode()).decode()
 
 
 def decrypt_token(ciphertext: str) -> str:
-    """Decrypt a stored token."""
+    """Decrypt a stored token.
+    
+    Also accepts values written by older versions, which wrapped the Fernet
+    token in a second layer of base64.
+    """
     if not ciphertext:
         return ""
     fernet = _get_fernet()
-    encrypted = base64.urlsafe_b64decode(ciphertext.encode())
+    encrypted = ciphertext.encode()
+    if not ciphertext.startswith(_FERNET_TOKEN_PREFIX):
+        encrypted = base64.urlsafe_b64decode(encrypted)
     decrypted = fernet.decrypt(encrypted)
     return decrypted.decode()
 
@@ -84,8 +122,26 @@ MS365_SCOPES = [
 ]
 
 
+# Decrypted tenant access tokens: tenant_id -> (access_token, expires_at).
+# Entries expire 5 minutes before the token does and are dropped when new
+# tokens are stored; a token refreshed by another worker is still valid
+# until its own expiry, so no cross-process invalidation is needed.
+_tenant_tokens = TTLCache(maxsize=1024, ttl=60 * 60)
+
+
 # State management (in-memory for now, can be moved to Redis later)
+OAUTH_STATE_TTL_SECONDS = 10 * 60
 _oauth_states: Dict[str, Dict[str, Any]] = {}
+# Min-heap of (expires_at, state) so expired states are evicted in expiry
+# order even if their callback never arrives
+_oauth_state_expiry: List[Tuple[float, str]] = []
+
+
+def _sweep_expired_states(now: float) -> None:
+    """Drop every stored state whose expiry has passed."""
+    while _oauth_state_expiry and _oauth_state_expiry[0][0] <= now:
+        _, state = heapq.heappop(_oauth_state_expiry)
+        _oauth_states.pop(state, None)
 
 
 def generate_oauth_state(identifier: UUID, provider: str) -> str:
@@ -96,12 +152,17 @@ def generate_oauth_state(identifier: UUID, provider: str) -> str:
         identifier: Can be user_id (old tenant flow) or credential_id (new credentials flow)
         provider: Provider type (ms365, google_workspace, etc.)
     """
+    now = time.monotonic()
+    _sweep_expired_states(now)
+    
     state = secrets.token_urlsafe(32)
+    expires_at = now + OAUTH_STATE_TTL_SECONDS
     _oauth_states[state] = {
         "identifier": str(identifier),  # Can be user_id or credential_id
         "provider": provider,
-        "expires_at": datetime.utcnow() + timedelta(minutes=10)
+        "expires_at": expires_at
     }
+    heapq.heappush(_oauth_state_expiry, (expires_at, state))
     return state
 
 
@@ -116,6 +177,8 @@ def validate_oauth_state(state: str, provider: str = None) -> Optional[UUID]:
     Returns:
         UUID of identifier (user_id or credential_id) if valid, None otherwise
     """
+    _sweep_expired_states(time.monotonic())
+    
     state_data = _oauth_states.get(state)
     if not state_data:
         return None
@@ -124,76 +187,71 @@ def validate_oauth_state(state: str, provider: str = None) -> Optional[UUID]:
     if provider and state_data["provider"] != provider:
         return None
     
-    if datetime.utcnow() > state_data["expires_at"]:
-        _oauth_states.pop(state, None)
-        return None
-    
     identifier = UUID(state_data["identifier"])
     _oauth_states.pop(state, None)  # One-time use
     return identifier
 
 
+# Everything but the state is fixed, so the URL prefix is encoded once
+_MS365_AUTHORIZE_PREFIX = MS365_AUTHORIZE_URL + "?" + urlencode({
+    "client_id": MS365_CLIENT_ID,
+    "response_type": "code",
+    "redirect_uri": MS365_REDIRECT_URI,
+    "scope": " ".join(MS365_SCOPES),
+    "response_mode": "query",
+}, quote_via=quote) + "&state="
+
+
 def build_ms365_authorize_url(user_id: UUID) -> str:
     """Build Microsoft authorization URL with state."""
-    state = generate_oauth_state(user_id, "ms365")
-    
-    params = {
-        "client_id": MS365_CLIENT_ID,
-        "response_type": "code",
-        "redirect_uri": MS365_REDIRECT_URI,
-        "scope": " ".join(MS365_SCOPES),
-        "state": state,
-        "response_mode": "query",
-    }
-    
-    query_string = "&".join(f"{k}={v}" for k, v in params.items())
-    return f"{MS365_AUTHORIZE_URL}?{query_string}"
+    # token_urlsafe output needs no percent-encoding
+    return _MS365_AUTHORIZE_PREFIX + generate_oauth_state(user_id, "ms365")
 
 
 async def exchange_code_for_tokens(code: str) -> Dict[str, Any]:
     """Exchange authorization code for access and refresh tokens."""
-    async with httpx.AsyncClient() as client:
-        response = await client.post(
-            MS365_TOKEN_URL,
-            data={
-                "client_id": MS365_CLIENT_ID,
-                "client_secret": MS365_CLIENT_SECRET,
-                "code": code,
-                "redirect_uri": MS365_REDIRECT_URI,
-                "grant_type": "authorization_code",
-            },
-            headers={"Content-Type": "application/x-www-form-urlencoded"}
-        )
-        response.raise_for_status()
-        return response.json()
+    client = get_http_client()
+    response = await client.post(
+        MS365_TOKEN_URL,
+        data={
+            "client_id": MS365_CLIENT_ID,
+            "client_secret": MS365_CLIENT_SECRET,
+            "code": code,
+            "redirect_uri": MS365_REDIRECT_URI,
+            "grant_type": "authorization_code",
+        },
+        headers={"Content-Type": "application/x-www-form-urlencoded"}
+    )
+    response.raise_for_status()
+    return from_json(response.content)
 
 
 async def refresh_access_token(refresh_token: str) -> Dict[str, Any]:
     """Refresh an expired access token."""
-    async with httpx.AsyncClient() as client:
-        response = await client.post(
-            MS365_TOKEN_URL,
-            data={
-                "client_id": MS365_CLIENT_ID,
-                "client_secret": MS365_CLIENT_SECRET,
-                "refresh_token": refresh_token,
-                "grant_type": "refresh_token",
-            },
-            headers={"Content-Type": "application/x-www-form-urlencoded"}
-        )
-        response.raise_for_status()
-        return response.json()
+    client = get_http_client()
+    response = await client.post(
+        MS365_TOKEN_URL,
+        data={
+            "client_id": MS365_CLIENT_ID,
+            "client_secret": MS365_CLIENT_SECRET,
+            "refresh_token": refresh_token,
+            "grant_type": "refresh_token",
+        },
+        headers={"Content-Type": "application/x-www-form-urlencoded"}
+    )
+    response.raise_for_status()
+    return from_json(response.content)
 
 
 async def get_ms365_user_info(access_token: str) -> Dict[str, Any]:
     """Get user info from Microsoft Graph to identify the account."""
-    async with httpx.AsyncClient() as client:
-        response = await client.get(
-            "https://graph.microsoft.com/v1.0/me",
-            headers={"Authorization": f"Bearer {access_token}"}
-        )
-        response.raise_for_status()
-        return response.json()
+    client = get_http_client()
+    response = await client.get(
+        "https://graph.microsoft.com/v1.0/me",
+        headers={"Authorization": f"Bearer {access_token}"}
+    )
+    response.raise_for_status()
+    return from_json(response.content)
 
 
 def store_tenant_tokens(tenant_id: UUID, tokens: Dict[str, Any], token_type: str = "delegated") -> None:
@@ -205,7 +263,7 @@ def store_tenant_tokens(tenant_id: UUID, tokens: Dict[str, Any], token_type: str
     
     encrypted_access = encrypt_token(access_token)
     encrypted_refresh = encrypt_token(refresh_token) if refresh_token else None
-    expires_at = datetime.utcnow() + timedelta(seconds=expires_in)
+    expires_at = datetime.now(timezone.utc) + timedelta(seconds=expires_in)
     scopes = scope.split() if scope else []
     
     with get_db_connection() as conn:
@@ -226,10 +284,25 @@ def store_tenant_tokens(tenant_id: UUID, tokens: Dict[str, Any], token_type: str
                 (uuid4(), tenant_id, token_type, encrypted_access, encrypted_refresh, scopes, expires_at)
             )
         conn.commit()
+    _tenant_tokens.pop(tenant_id)
 
 
 async def get_tenant_token(tenant_id: UUID) -> str:
     """Get valid access token for tenant, refreshing if needed."""
+    access_token, _ = await get_tenant_token_with_expiry(tenant_id)
+    return access_token
+
+
+async def get_tenant_token_with_expiry(tenant_id: UUID) -> Tuple[str, datetime]:
+    """Get valid access token for tenant and its expiry, refreshing if needed.
+    
+    Decrypted tokens are cached per process until 5 minutes before they
+    expire, so repeat calls skip the database read and the decrypt.
+    """
+    cached = _tenant_tokens.get(tenant_id)
+    if cached is not None:
+        return cached
+    
     with get_db_connection() as conn:
         with conn.cursor() as cur:
             cur.execute(
@@ -245,11 +318,15 @@ async def get_tenant_token(tenant_id: UUID) -> str:
             if not row:
                 raise ValueError(f"No tokens found for tenant {tenant_id}")
             
-            encrypted_access, encrypted_refresh, expires_at = row
+            encrypted_refresh = row['encrypted_refresh_token']
+            expires_at = row['expires_at']
             
             # If token expires in more than 5 minutes, return it
-            if datetime.utcnow() + timedelta(minutes=5) < expires_at:
-                return decrypt_token(encrypted_access)
+            fresh_for = expires_at.timestamp() - time.time() - 300
+            if fresh_for > 0:
+                result = (decrypt_token(row['encrypted_access_token']), expires_at)
+                _tenant_tokens.set(tenant_id, result, ttl=fresh_for)
+                return result
             
             # Token is expired or expiring soon, refresh it
             if not encrypted_refresh:
@@ -261,7 +338,10 @@ async def get_tenant_token(tenant_id: UUID) -> str:
             # Store the new tokens
             store_tenant_tokens(tenant_id, new_tokens)
             
-            return new_tokens["access_token"]
+            expires_in = new_tokens.get("expires_in", 3600)
+            result = (new_tokens["access_token"], datetime.now(timezone.utc) + timedelta(seconds=expires_in))
+            _tenant_tokens.set(tenant_id, result, ttl=expires_in - 300)
+            return result
 
 
 async def refresh_tenant_token(tenant_id: UUID) -> str:
@@ -1,46 +1,119 @@
 """OTP generation, storage, and validation service."""
+import hmac
+import logging
 import os
-import secrets
-from datetime import datetime, timedelta, timezone
+import time
+from functools import lru_cache
 from uuid import UUID, uuid4
 from typing import Optional
-import bcrypt
+from .. import envs
 from .database import get_db_connection
+from .jwt import get_jwt_secret
+from .redis_client import get_redis
+from .users import Email
 
+log = logging.getLogger("auth.otp")
 
+_otp_key: Optional[bytes] = None
+
+
+@lru_cache(maxsize=1)
 def get_otp_config():
-    """Get OTP configuration from environment."""
+    """Get OTP configuration (from envs, built once)."""
     return {
-        "expiry_minutes": int(os.environ.get("OTP_EXPIRY_MINUTES", "5")),
-        "max_attempts": int(os.environ.get("OTP_MAX_ATTEMPTS", "8")),
-        "rate_limit_window_minutes": int(os.environ.get("RATE_LIMIT_WINDOW_MINUTES", "15")),
-        "rate_limit_max_requests": int(os.environ.get("RATE_LIMIT_MAX_REQUESTS", "3")),
+        "expiry_minutes": envs.OTP_EXPIRY_MINUTES,
+        "max_attempts": envs.OTP_MAX_ATTEMPTS,
+        "rate_limit_window_minutes": envs.RATE_LIMIT_WINDOW_MINUTES,
+        "rate_limit_max_requests": envs.RATE_LIMIT_MAX_REQUESTS,
     }
 
 
+def _otp_from_bytes(raw: bytes) -> str:
+    """Reduce 4 random bytes to a 6-digit code (bias below 0.03% per code)."""
+    return f"{int.from_bytes(raw, 'big') % 1000000:06d}"
+
+
 def generate_otp() -> str:
-    """Generate a random 6-digit OTP."""
-    return f"{secrets.randbelow(1000000):06d}"
+    """Generate a random 6-digit OTP.
+    
+    One 32-bit draw reduced mod 10^6: a single urandom call with no
+    rejection loop.
+    """
+    return _otp_from_bytes(os.urandom(4))
+
+
+def generate_challenge() -> tuple[UUID, str]:
+    """Generate a challenge ID and its 6-digit OTP from one urandom read.
+    
+    Returns:
+        (challenge_id, otp) - pass challenge_id on to store_otp
+    """
+    raw = os.urandom(20)
+    return UUID(bytes=raw[:16], version=4), _otp_from_bytes(raw[16:])
+
+
+def _get_otp_key() -> bytes:
+    """Get the OTP digest key (OTP_HMAC_KEY, else JWT_SECRET), read once."""
+    global _otp_key
+    if _otp_key is None:
+        _otp_key = (envs.OTP_HMAC_KEY or get_jwt_secret()).encode()
+    return _otp_key
 
 
 def hash_otp(otp: str) -> bytes:
-    """Hash OTP using bcrypt, return as bytes."""
-    salt = bcrypt.gensalt()
-    return bcrypt.hashpw(otp.encode(), salt)
+    """Hash OTP with keyed HMAC-SHA256, return as bytes.
+    
+    A 6-digit code expires in minutes and allows only a few attempts, so a
+    slow password hash adds CPU cost without adding protection.
+    """
+    # One-shot OpenSSL HMAC: no Python-level hmac object per call
+    return hmac.digest(_get_otp_key(), otp.encode(), "sha256")
 
 
 def verify_otp_hash(otp: str, otp_hash: bytes) -> bool:
     """Verify OTP against hash."""
-    try:
-        return bcrypt.checkpw(otp.encode(), otp_hash)
-    except Exception:
-        return False
+    return hmac.compare_digest(hash_otp(otp), bytes(otp_hash))
+
+
+# Fixed-window counter: the window start is now() rounded down to a multiple
+# of the window length, so every request in a window upserts the same row
+# and the increment and the read happen in one atomic statement
+RATE_LIMIT_HIT_SQL = """
+    INSERT INTO auth.rate_limits
+        (id, subject_type, subject, window_start, window_seconds, count, limit_value)
+    VALUES (
+        %(id)s, 'phone', %(subject)s,
+        to_timestamp(floor(extract(epoch FROM now()) / %(window_seconds)s::int) * %(window_seconds)s::int),
+        %(window_seconds)s, 1, %(limit_value)s
+    )
+    ON CONFLICT (subject_type, subject, window_start, window_seconds)
+    DO UPDATE SET count = auth.rate_limits.count + 1
+    RETURNING count
+"""
+
 
+# Redis sliding-window limiter over a sorted set of request timestamps (ms):
+# drop entries older than the window, then record this request only if the
+# window still has room. Returns 1 when the request is rate limited.
+RATE_LIMIT_LUA = """
+local key, now, window, limit, member = KEYS[1], tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3]), ARGV[4]
+redis.call('ZREMRANGEBYSCORE', key, 0, now - window)
+if redis.call('ZCARD', key) >= limit then
+    return 1
+end
+redis.call('ZADD', key, now, member)
+redis.call('PEXPIRE', key, window)
+return 0
+"""
+_rate_limit_script = None
 
-def check_rate_limit(email: str, request_ip: Optional[str] = None) -> bool:
+
+def check_rate_limit(email: Email, request_ip: Optional[str] = None) -> bool:
     """Check if email has exceeded rate limit for OTP requests.
     
     Uses auth.rate_limits table with subject_type='phone' (legacy naming, stores email).
+    Every call counts as a request; concurrent calls cannot both slip under
+    the limit because the count is incremented and read in one statement.
     
     Returns:
         True if rate limit exceeded, False otherwise
@@ -49,166 +122,200 @@ def check_rate_limit(email: str, request_ip: Optional[str] = None) -> bool:
     window_seconds = config["rate_limit_window_minutes"] * 60
     limit_value = config["rate_limit_max_requests"]
     
+    client = get_redis()
+    if client is not None:
+        # Rolling window in one atomic script call (one round trip)
+        global _rate_limit_script
+        try:
+            if _rate_limit_script is None:
+                # Sent by SHA (EVALSHA) after the first call
+                _rate_limit_script = client.register_script(RATE_LIMIT_LUA)
+            limited = _rate_limit_script(
+                keys=[f"rl:otp:{email}"],
+                args=[int(time.time() * 1000), window_seconds * 1000, limit_value, uuid4().hex],
+            )
+            return bool(limited)
+        except Exception:
+            log.warning("Redis rate limit unavailable, falling back to Postgres", exc_info=True)
+    
     with get_db_connection() as conn:
         with conn.cursor() as cur:
-            now = datetime.now(timezone.utc)
-            window_start = now
-            subject = email.lower()
-            
-            # Check email rate limit (using 'phone' subject_type for backwards compat)
-            cur.execute(
-                """SELECT count, window_start 
-                   FROM auth.rate_limits 
-                   WHERE subject_type = 'phone' AND subject = %s 
-                   AND window_seconds = %s""",
-                (subject, window_seconds)
-            )
-            row = cur.fetchone()
-            
-            if row:
-                window_start_ts = row["window_start"]
-                count = row["count"]
-                
-                # Check if window has expired
-                if now - window_start_ts > timedelta(seconds=window_seconds):
-                    # Reset window
-                    window_start = now
-                    count = 0
-                else:
-                    # Check if limit exceeded
-                    if count >= limit_value:
-                        return True
-                    window_start = window_start_ts
-                    count = count + 1
-            else:
-                count = 1
-            
-            # Upsert rate limit record
-            cur.execute(
-                """INSERT INTO auth.rate_limits 
-                   (id, subject_type, subject, window_start, window_seconds, count, limit_value)
-                   VALUES (%s, 'phone', %s, %s, %s, %s, %s)
-                   ON CONFLICT (subject_type, subject, window_start, window_seconds) 
-                   DO UPDATE SET count = %s""",
-                (uuid4(), subject, window_start, window_seconds, count, limit_value, count)
-            )
-            conn.commit()
+            # Email rate limit (using 'phone' subject_type for backwards compat)
+            cur.execute(RATE_LIMIT_HIT_SQL, {
+                "id": uuid4(),
+                "subject": email,
+                "window_seconds": window_seconds,
+                "limit_value": limit_value,
+            }, prepare=True)
+            count = cur.fetchone()["count"]
             
-            return False
+            return count > limit_value
+
+
+# OTP challenge statements, prepared once per pooled connection (prepare=True)
+
+# Cancel the user's pending challenge and insert the new one in a single
+# statement. The INSERT reads from the canceled CTE so the UPDATE runs to
+# completion first; otherwise the old 'sent' row would still occupy the
+# otp_one_active_per_user unique index when the new row is checked.
+# Untyped (str/None) parameters in a SELECT list default to text, hence
+# the explicit inet cast.
+ROTATE_CHALLENGE_SQL = """
+    WITH canceled AS (
+        UPDATE auth.otp_challenges
+        SET status = 'canceled'
+        WHERE user_id = %(user_id)s AND status = 'sent'
+        RETURNING 1
+    )
+    INSERT INTO auth.otp_challenges
+        (id, user_id, code_hash, expires_at, max_attempts, request_ip, user_agent)
+    SELECT %(id)s, %(user_id)s, %(code_hash)s,
+           NOW() + make_interval(mins => %(expiry_minutes)s), %(max_attempts)s,
+           %(request_ip)s::inet, %(user_agent)s::text
+    WHERE (SELECT count(*) FROM canceled) >= 0
+"""
+
+# Locks the user's active challenge and applies the attempt in one statement:
+# an expired or exhausted challenge is closed out, anything else has its
+# attempt counted. The row stays locked until validate_otp commits, so
+# concurrent submissions for the same challenge are checked one at a time.
+# RETURNING reports the attempt count from before this submission.
+ATTEMPT_CHALLENGE_SQL = """
+    WITH c AS (
+        SELECT id, code_hash, attempts, max_attempts, expires_at
+        FROM auth.otp_challenges
+        WHERE user_id = %s AND status = 'sent'
+        ORDER BY sent_at DESC
+        LIMIT 1
+        FOR UPDATE
+    )
+    UPDATE auth.otp_challenges o
+    SET status = CASE
+            WHEN c.expires_at < NOW() THEN 'expired'
+            WHEN c.attempts >= c.max_attempts THEN 'denied'
+            ELSE o.status
+        END,
+        attempts = CASE
+            WHEN c.expires_at < NOW() OR c.attempts >= c.max_attempts THEN o.attempts
+            ELSE o.attempts + 1
+        END
+    FROM c
+    WHERE o.id = c.id
+    RETURNING o.id, o.status, c.code_hash, c.attempts, c.max_attempts
+"""
+
+SET_CHALLENGE_STATUS_SQL = "UPDATE auth.otp_challenges SET status = %s WHERE id = %s"
+
+APPROVE_CHALLENGE_SQL = "UPDATE auth.otp_challenges SET status = 'approved', used_at = NOW() WHERE id = %s"
 
 
 def store_otp(user_id: UUID, otp: str, request_ip: Optional[str] = None, 
-               user_agent: Optional[str] = None) -> UUID:
+               user_agent: Optional[str] = None,
+               challenge_id: Optional[UUID] = None) -> UUID:
     """Store OTP challenge in auth.otp_challenges table.
     
+    Args:
+        challenge_id: ID from generate_challenge(); a new uuid4 if omitted
+    
     Returns:
         Challenge ID
     """
     config = get_otp_config()
     code_hash = hash_otp(otp)
-    expires_at = datetime.now(timezone.utc) + timedelta(minutes=config["expiry_minutes"])
     max_attempts = config["max_attempts"]
-    challenge_id = uuid4()
+    if challenge_id is None:
+        challenge_id = uuid4()
     
     with get_db_connection() as conn:
         with conn.cursor() as cur:
-            # Cancel any existing 'sent' challenges for this user
-            cur.execute(
-                """UPDATE auth.otp_challenges 
-                   SET status = 'canceled' 
-                   WHERE user_id = %s AND status = 'sent'""",
-                (user_id,)
-            )
-            
-            # Insert new challenge
-            cur.execute(
-                """INSERT INTO auth.otp_challenges 
-                   (id, user_id, code_hash, expires_at, max_attempts, request_ip, user_agent)
-                   VALUES (%s, %s, %s, %s, %s, %s, %s)""",
-                (challenge_id, user_id, code_hash, expires_at, max_attempts, request_ip, user_agent)
-            )
-            conn.commit()
+            # Cancel any existing 'sent' challenge and insert the new one
+            cur.execute(ROTATE_CHALLENGE_SQL, {
+                "id": challenge_id,
+                "user_id": user_id,
+                "code_hash": code_hash,
+                "expiry_minutes": config["expiry_minutes"],
+                "max_attempts": max_attempts,
+                "request_ip": request_ip,
+                "user_agent": user_agent,
+            }, prepare=True)
             return challenge_id
 
 
+def cancel_otp(challenge_id: UUID) -> None:
+    """Cancel a challenge whose code could not be delivered."""
+    with get_db_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(SET_CHALLENGE_STATUS_SQL, ('canceled', challenge_id), prepare=True)
+
+
 def validate_otp(user_id: UUID, otp: str) -> tuple[bool, str]:
     """Validate OTP for user.
     
     Returns:
         (success, error_message)
     """
-    config = get_otp_config()
-    
     with get_db_connection() as conn:
         with conn.cursor() as cur:
-            # Get active challenge
-            cur.execute(
-                """SELECT id, code_hash, attempts, max_attempts, expires_at, status
-                   FROM auth.otp_challenges 
-                   WHERE user_id = %s AND status = 'sent'
-                   ORDER BY sent_at DESC
-                   LIMIT 1""",
-                (user_id,)
-            )
+            # Lock the active challenge and record this attempt (one round trip)
+            cur.execute(ATTEMPT_CHALLENGE_SQL, (user_id,), prepare=True)
             row = cur.fetchone()
             
             if not row:
                 return False, "No active OTP found for this user"
             
-            challenge_id = row["id"]
-            
-            # Check expiry
-            if datetime.now(timezone.utc) > row["expires_at"]:
-                cur.execute(
-                    "UPDATE auth.otp_challenges SET status = 'expired' WHERE id = %s",
-                    (challenge_id,)
-                )
-                conn.commit()
+            if row["status"] == 'expired':
                 return False, "OTP has expired"
             
-            # Check attempts
-            if row["attempts"] >= row["max_attempts"]:
-                cur.execute(
-                    "UPDATE auth.otp_challenges SET status = 'denied' WHERE id = %s",
-                    (challenge_id,)
-                )
-                conn.commit()
+            if row["status"] == 'denied':
                 return False, "Maximum attempts exceeded"
             
-            # Verify OTP
+            # Verify OTP (the attempt is already counted)
             if not verify_otp_hash(otp, row["code_hash"]):
-                # Increment attempts
-                cur.execute(
-                    "UPDATE auth.otp_challenges SET attempts = attempts + 1 WHERE id = %s",
-                    (challenge_id,)
-                )
-                conn.commit()
                 remaining = row["max_attempts"] - row["attempts"] - 1
                 return False, f"Invalid OTP. {remaining} attempts remaining."
             
             # Success - mark as approved
-            cur.execute(
-                "UPDATE auth.otp_challenges SET status = 'approved', used_at = NOW() WHERE id = %s",
-                (challenge_id,)
-            )
-            conn.commit()
+            cur.execute(APPROVE_CHALLENGE_SQL, (row["id"],), prepare=True)
             
             return True, ""
 
 
-def cleanup_expired_otps() -> int:
+# Expire at most this many challenges per transaction; SKIP LOCKED leaves
+# rows that validate_otp currently holds for a later pass
+EXPIRE_BATCH_SIZE = 1000
+EXPIRE_BATCH_SQL = """
+    WITH batch AS (
+        SELECT id FROM auth.otp_challenges
+        WHERE status = 'sent' AND expires_at < NOW()
+        LIMIT %s
+        FOR UPDATE SKIP LOCKED
+    )
+    UPDATE auth.otp_challenges c
+    SET status = 'expired'
+    FROM batch
+    WHERE c.id = batch.id
+"""
+
+
+def cleanup_expired_otps(pause_seconds: float = 0.05) -> int:
     """Mark expired OTP challenges as expired.
     
+    Works in batches of EXPIRE_BATCH_SIZE rows, each committed on its own,
+    so a large backlog never holds row locks or WAL in one long transaction.
+    
+    Args:
+        pause_seconds: Sleep between full batches to cap write rate
+    
     Returns:
         Number of OTPs marked as expired
     """
-    with get_db_connection() as conn:
-        with conn.cursor() as cur:
-            cur.execute(
-                """UPDATE auth.otp_challenges 
-                   SET status = 'expired' 
-                   WHERE status = 'sent' AND expires_at < NOW()"""
-            )
-            updated = cur.rowcount
-            conn.commit()
-            return updated
+    total = 0
+    while True:
+        with get_db_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(EXPIRE_BATCH_SQL, (EXPIRE_BATCH_SIZE,), prepare=True)
+                updated = cur.rowcount
+        total += updated
+        if updated < EXPIRE_BATCH_SIZE:
+            return total
+        time.sleep(pause_seconds)
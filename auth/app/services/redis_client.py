@@ -0,0 +1,26 @@
+"""Optional Redis connection for short-lived shared counters."""
+from typing import Any, Optional
+from .. import envs
+
+
+_client: Optional[Any] = None
+
+
+def get_redis() -> Optional[Any]:
+    """Get the process-wide Redis client, or None when REDIS_URL is unset.
+
+    The redis package is only imported when a URL is configured. Socket
+    timeouts are short so callers can fall back to Postgres quickly when
+    Redis is unreachable.
+    """
+    global _client
+    if not envs.REDIS_URL:
+        return None
+    if _client is None:
+        import redis
+        _client = redis.Redis.from_url(
+            envs.REDIS_URL,
+            socket_connect_timeout=0.5,
+            socket_timeout=0.5,
+        )
+    return _client
@@ -1,15 +1,17 @@
 """SMS delivery service using Twilio."""
-import os
+from functools import lru_cache
 from typing import Optional
 from twilio.rest import Client
 from twilio.base.exceptions import TwilioRestException
+from .. import envs
 
 
+@lru_cache(maxsize=1)
 def get_twilio_config() -> Optional[dict]:
-    """Get Twilio configuration from environment."""
-    account_sid = os.environ.get("TWILIO_ACCOUNT_SID")
-    auth_token = os.environ.get("TWILIO_AUTH_TOKEN")
-    phone_number = os.environ.get("TWILIO_PHONE_NUMBER")
+    """Get Twilio configuration from environment (built once)."""
+    account_sid = envs.TWILIO_ACCOUNT_SID
+    auth_token = envs.TWILIO_AUTH_TOKEN
+    phone_number = envs.TWILIO_PHONE_NUMBER
     
     if not all([account_sid, auth_token, phone_number]):
         return None
@@ -26,6 +28,16 @@ def is_twilio_configured() -> bool:
     return get_twilio_config() is not None
 
 
+@lru_cache(maxsize=1)
+def _get_twilio_client(account_sid: str, auth_token: str) -> Client:
+    """Get a shared Twilio client.
+    
+    The client keeps its HTTPS session to api.twilio.com open, so sends
+    after the first skip the TCP and TLS handshakes.
+    """
+    return Client(account_sid, auth_token)
+
+
 def send_otp_sms(phone: str, otp: str) -> bool:
     """Send OTP via SMS using Twilio.
     
@@ -41,7 +53,7 @@ def send_otp_sms(phone: str, otp: str) -> bool:
         raise ValueError("Twilio not configured. Set TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN, and TWILIO_PHONE_NUMBER")
     
     try:
-        client = Client(config["account_sid"], config["auth_token"])
+        client = _get_twilio_client(config["account_sid"], config["auth_token"])
         
         message = client.messages.create(
             body=f"Your Flovify verification code is: {otp}\n\nThis code expires in 5 minutes. Never share this code.",
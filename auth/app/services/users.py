@@ -1,28 +1,41 @@
 """User management service."""
-from typing import Optional
+from typing import NewType, Optional
 from datetime import datetime
 from uuid import UUID, uuid4
+from dataclasses import dataclass
 import psycopg
+from psycopg.rows import class_row
 from .database import get_db_connection
 
 
+# An email address already in stored form (stripped, lowercased). Service
+# functions take Email so callers normalize once at the API boundary.
+Email = NewType("Email", str)
+
+
+def normalize_email(raw: str) -> Email:
+    """Normalize an incoming email address to its stored form."""
+    return Email(raw.strip().lower())
+
+
+@dataclass(slots=True)
 class User:
-    """User model - email-primary authentication with optional phone and OTP preference."""
-    def __init__(self, id: UUID, email: str, phone: Optional[str],
-                 otp_preference: Optional[str], role: str, is_active: bool,
-                 verified_at: Optional[datetime], last_login_at: Optional[datetime],
-                 created_by: Optional[UUID], created_at: datetime, updated_at: datetime):
-        self.id = id
-        self.email = email
-        self.phone = phone
-        self.otp_preference = otp_preference
-        self.role = role
-        self.is_active = is_active
-        self.verified_at = verified_at
-        self.last_login_at = last_login_at
-        self.created_by = created_by
-        self.created_at = created_at
-        self.updated_at = updated_at
+    """User model - email-primary authentication with optional phone and OTP preference.
+
+    Fields are in auth.users column order so class_row(User) can build
+    instances straight from query results.
+    """
+    id: UUID
+    email: str
+    phone: Optional[str]
+    otp_preference: Optional[str]
+    role: str
+    is_active: bool
+    verified_at: Optional[datetime]
+    last_login_at: Optional[datetime]
+    created_by: Optional[UUID]
+    created_at: datetime
+    updated_at: datetime
     
     def to_dict(self):
         """Convert to dictionary."""
@@ -49,164 +62,121 @@ class User:
         }
 
 
-def find_user_by_email(email: str) -> Optional[User]:
-    """Find user by email address (case-insensitive)."""
+# Column list in User field order; every query below returns it so
+# class_row(User) can build the objects directly
+USER_COLUMNS = """id, email, phone, otp_preference, role, is_active, verified_at,
+                  last_login_at, created_by, created_at, updated_at"""
+
+FIND_USER_BY_EMAIL_SQL = f"SELECT {USER_COLUMNS} FROM auth.users WHERE email = %s"
+
+FIND_USER_BY_ID_SQL = f"SELECT {USER_COLUMNS} FROM auth.users WHERE id = %s"
+
+CREATE_USER_SQL = f"""
+    INSERT INTO auth.users (id, email, phone, otp_preference, role, is_active, created_by)
+    VALUES (%s, %s, %s, %s, %s, %s, %s)
+    RETURNING {USER_COLUMNS}
+"""
+
+UPDATE_LAST_LOGIN_SQL = "UPDATE auth.users SET last_login_at = NOW(), updated_at = NOW() WHERE email = %s"
+
+VERIFY_USER_SQL = "UPDATE auth.users SET verified_at = NOW(), updated_at = NOW() WHERE email = %s"
+
+# Successful OTP login: stamp last_login_at and, on the first login only,
+# verified_at, in one statement
+RECORD_LOGIN_SQL = """
+    UPDATE auth.users
+    SET last_login_at = NOW(), verified_at = COALESCE(verified_at, NOW()), updated_at = NOW()
+    WHERE email = %s
+"""
+
+LIST_USERS_SQL = f"SELECT {USER_COLUMNS} FROM auth.users ORDER BY created_at DESC"
+
+UPDATE_USER_ROLE_SQL = f"""
+    UPDATE auth.users
+    SET role = %s, updated_at = NOW()
+    WHERE id = %s
+    RETURNING {USER_COLUMNS}
+"""
+
+UPDATE_USER_STATUS_SQL = f"""
+    UPDATE auth.users
+    SET is_active = %s, updated_at = NOW()
+    WHERE id = %s
+    RETURNING {USER_COLUMNS}
+"""
+
+DELETE_USER_CHALLENGES_SQL = "DELETE FROM auth.otp_challenges WHERE user_id = %s"
+
+DELETE_USER_SQL = "DELETE FROM auth.users WHERE id = %s RETURNING id"
+
+# Row factory shared by every User-returning cursor
+_user_row = class_row(User)
+
+
+def find_user_by_email(email: Email) -> Optional[User]:
+    """Find user by normalized email address."""
     with get_db_connection() as conn:
-        with conn.cursor() as cur:
-            cur.execute(
-                """SELECT id, email, phone, otp_preference, role, is_active, verified_at,
-                          last_login_at, created_by, created_at, updated_at
-                   FROM auth.users WHERE lower(email) = lower(%s)""",
-                (email,)
-            )
-            row = cur.fetchone()
-            if row:
-                return User(
-                    row['id'], row['email'], row['phone'], row['otp_preference'],
-                    row['role'], row['is_active'], row['verified_at'], row['last_login_at'],
-                    row['created_by'], row['created_at'], row['updated_at']
-                )
-            return None
+        with conn.cursor(row_factory=_user_row) as cur:
+            cur.execute(FIND_USER_BY_EMAIL_SQL, (email,))
+            return cur.fetchone()
 
 
 def find_user_by_id(user_id) -> Optional[User]:
     """Find user by ID (accepts UUID or string)."""
     with get_db_connection() as conn:
-        with conn.cursor() as cur:
+        with conn.cursor(row_factory=_user_row) as cur:
             cur.execute(
-                """SELECT id, email, phone, otp_preference, role, is_active, verified_at,
-                          last_login_at, created_by, created_at, updated_at
-                   FROM auth.users WHERE id = %s""",
+                FIND_USER_BY_ID_SQL,
                 (str(user_id) if not isinstance(user_id, str) else user_id,)
             )
-            row = cur.fetchone()
-            if row:
-                return User(
-                    row['id'], row['email'], row['phone'], row['otp_preference'],
-                    row['role'], row['is_active'], row['verified_at'], row['last_login_at'],
-                    row['created_by'], row['created_at'], row['updated_at']
-                )
-            return None
+            return cur.fetchone()
 
 
-def create_user(email: str, phone: Optional[str] = None, 
+def create_user(email: Email, phone: Optional[str] = None, 
                 otp_preference: Optional[str] = None, role: str = 'user',
                 created_by: Optional[UUID] = None) -> User:
     """Create a new user with email as primary identifier."""
     with get_db_connection() as conn:
-        with conn.cursor() as cur:
+        with conn.cursor(row_factory=_user_row) as cur:
             try:
                 user_id = uuid4()
                 cur.execute(
-                    """INSERT INTO auth.users (id, email, phone, otp_preference, role, is_active, created_by)
-                       VALUES (%s, %s, %s, %s, %s, %s, %s)
-                       RETURNING id, email, phone, otp_preference, role, is_active, verified_at,
-                                 last_login_at, created_by, created_at, updated_at""",
-                    (user_id, email.lower(), phone, otp_preference, role, True, created_by)
-                )
-                conn.commit()
-                row = cur.fetchone()
-                return User(
-                    row['id'], row['email'], row['phone'], row['otp_preference'],
-                    row['role'], row['is_active'], row['verified_at'], row['last_login_at'],
-                    row['created_by'], row['created_at'], row['updated_at']
+                    CREATE_USER_SQL,
+                    (user_id, email, phone, otp_preference, role, True, created_by)
                 )
+                return cur.fetchone()
             except psycopg.errors.UniqueViolation:
                 conn.rollback()
                 raise ValueError(f"User with email {email} already exists")
 
 
-def update_last_login(email: str) -> None:
+def update_last_login(email: Email) -> None:
     """Update user's last login timestamp."""
     with get_db_connection() as conn:
         with conn.cursor() as cur:
-            cur.execute(
-                "UPDATE auth.users SET last_login_at = NOW(), updated_at = NOW() WHERE lower(email) = lower(%s)",
-                (email,)
-            )
-            conn.commit()
+            cur.execute(UPDATE_LAST_LOGIN_SQL, (email,))
 
 
-def verify_user(email: str) -> None:
+def verify_user(email: Email) -> None:
     """Mark user as verified (set verified_at timestamp)."""
     with get_db_connection() as conn:
         with conn.cursor() as cur:
-            cur.execute(
-                "UPDATE auth.users SET verified_at = NOW(), updated_at = NOW() WHERE lower(email) = lower(%s)",
-                (email,)
-            )
-            conn.commit()
+            cur.execute(VERIFY_USER_SQL, (email,))
 
 
-def update_user(email: str, phone: Optional[str] = None,
-                otp_preference: Optional[str] = None, role: Optional[str] = None,
-                is_active: Optional[bool] = None) -> Optional[User]:
-    """Update user information."""
-    updates = []
-    params = []
-    
-    if phone is not None:
-        updates.append("phone = %s")
-        params.append(phone)
-    
-    if otp_preference is not None:
-        updates.append("otp_preference = %s")
-        params.append(otp_preference)
-    
-    if role is not None:
-        updates.append("role = %s")
-        params.append(role)
-    
-    if is_active is not None:
-        updates.append("is_active = %s")
-        params.append(is_active)
-    
-    if not updates:
-        return find_user_by_email(email)
-    
-    updates.append("updated_at = NOW()")
-    params.append(email.lower())
-    
+def record_login(email: Email) -> None:
+    """Update last login and mark the user verified if not already."""
     with get_db_connection() as conn:
         with conn.cursor() as cur:
-            cur.execute(
-                f"""UPDATE auth.users 
-                    SET {', '.join(updates)}
-                    WHERE lower(email) = lower(%s)
-                    RETURNING id, email, phone, otp_preference, role, is_active, verified_at,
-                              last_login_at, created_by, created_at, updated_at""",
-                params
-            )
-            conn.commit()
-            row = cur.fetchone()
-            if row:
-                return User(
-                    row['id'], row['email'], row['phone'], row['otp_preference'],
-                    row['role'], row['is_active'], row['verified_at'], row['last_login_at'],
-                    row['created_by'], row['created_at'], row['updated_at']
-                )
-            return None
+            cur.execute(RECORD_LOGIN_SQL, (email,))
 
 
 def list_all_users() -> list[User]:
     """List all users (admin function)."""
     with get_db_connection() as conn:
-        with conn.cursor() as cur:
-            cur.execute(
-                """SELECT id, email, phone, otp_preference, role, is_active, verified_at,
-                          last_login_at, created_by, created_at, updated_at
-                   FROM auth.users
-                   ORDER BY created_at DESC"""
-            )
-            rows = cur.fetchall()
-            return [
-                User(
-                    row['id'], row['email'], row['phone'], row['otp_preference'],
-                    row['role'], row['is_active'], row['verified_at'], row['last_login_at'],
-                    row['created_by'], row['created_at'], row['updated_at']
-                )
-                for row in rows
-            ]
+        with conn.cursor(row_factory=_user_row) as cur:
+            cur.execute(LIST_USERS_SQL)
+            return cur.fetchall()
 
 
 def update_user_role(user_id: str, role: str) -> User:
@@ -215,98 +185,68 @@ def update_user_role(user_id: str, role: str) -> User:
         raise ValueError(f"Invalid role: {role}")
     
     with get_db_connection() as conn:
-        with conn.cursor() as cur:
-            cur.execute(
-                """UPDATE auth.users 
-                   SET role = %s, updated_at = NOW()
-                   WHERE id = %s
-                   RETURNING id, email, phone, otp_preference, role, is_active, verified_at,
-                             last_login_at, created_by, created_at, updated_at""",
-                (role, user_id)
-            )
-            conn.commit()
-            row = cur.fetchone()
-            if not row:
+        with conn.cursor(row_factory=_user_row) as cur:
+            cur.execute(UPDATE_USER_ROLE_SQL, (role, user_id))
+            user = cur.fetchone()
+            if not user:
                 raise ValueError("User not found")
-            return User(
-                row['id'], row['email'], row['phone'], row['otp_preference'],
-                row['role'], row['is_active'], row['verified_at'], row['last_login_at'],
-                row['created_by'], row['created_at'], row['updated_at']
-            )
+            return user
 
 
 def update_user_status(user_id: str, is_active: bool) -> User:
     """Update user active status (admin function)."""
     with get_db_connection() as conn:
-        with conn.cursor() as cur:
-            cur.execute(
-                """UPDATE auth.users 
-                   SET is_active = %s, updated_at = NOW()
-                   WHERE id = %s
-                   RETURNING id, email, phone, otp_preference, role, is_active, verified_at,
-                             last_login_at, created_by, created_at, updated_at""",
-                (is_active, user_id)
-            )
-            conn.commit()
-            row = cur.fetchone()
-            if not row:
+        with conn.cursor(row_factory=_user_row) as cur:
+            cur.execute(UPDATE_USER_STATUS_SQL, (is_active, user_id))
+            user = cur.fetchone()
+            if not user:
                 raise ValueError("User not found")
-            return User(
-                row['id'], row['email'], row['phone'], row['otp_preference'],
-                row['role'], row['is_active'], row['verified_at'], row['last_login_at'],
-                row['created_by'], row['created_at'], row['updated_at']
-            )
+            return user
 
 
-def update_user(user_id: str, email: Optional[str] = None, phone: Optional[str] = None,
+def update_user(user_id: str, email: Optional[Email] = None, phone: Optional[str] = None,
                 otp_preference: Optional[str] = None, role: Optional[str] = None,
                 is_active: Optional[bool] = None) -> User:
     """Update user fields (admin function)."""
+    # Build dynamic UPDATE query based on provided fields
+    updates = []
+    params = []
+    
+    if email is not None:
+        updates.append("email = %s")
+        params.append(email)
+    if phone is not None:
+        updates.append("phone = %s")
+        params.append(phone)
+    if otp_preference is not None:
+        updates.append("otp_preference = %s")
+        params.append(otp_preference)
+    if role is not None:
+        updates.append("role = %s")
+        params.append(role)
+    if is_active is not None:
+        updates.append("is_active = %s")
+        params.append(is_active)
+    
+    if not updates:
+        # No fields to update, just return current user
+        return find_user_by_id(user_id)
+    
+    updates.append("updated_at = NOW()")
+    params.append(user_id)
+    
+    query = f"""UPDATE auth.users 
+               SET {', '.join(updates)}
+               WHERE id = %s
+               RETURNING {USER_COLUMNS}"""
+    
     with get_db_connection() as conn:
-        with conn.cursor() as cur:
-            # Build dynamic UPDATE query based on provided fields
-            updates = []
-            params = []
-            
-            if email is not None:
-                updates.append("email = %s")
-                params.append(email)
-            if phone is not None:
-                updates.append("phone = %s")
-                params.append(phone)
-            if otp_preference is not None:
-                updates.append("otp_preference = %s")
-                params.append(otp_preference)
-            if role is not None:
-                updates.append("role = %s")
-                params.append(role)
-            if is_active is not None:
-                updates.append("is_active = %s")
-                params.append(is_active)
-            
-            if not updates:
-                # No fields to update, just return current user
-                return find_user_by_id(user_id)
-            
-            updates.append("updated_at = NOW()")
-            params.append(user_id)
-            
-            query = f"""UPDATE auth.users 
-                       SET {', '.join(updates)}
-                       WHERE id = %s
-                       RETURNING id, email, phone, otp_preference, role, is_active, verified_at,
-                                 last_login_at, created_by, created_at, updated_at"""
-            
+        with conn.cursor(row_factory=_user_row) as cur:
             cur.execute(query, params)
-            conn.commit()
-            row = cur.fetchone()
-            if not row:
+            user = cur.fetchone()
+            if not user:
                 raise ValueError("User not found")
-            return User(
-                row['id'], row['email'], row['phone'], row['otp_preference'],
-                row['role'], row['is_active'], row['verified_at'], row['last_login_at'],
-                row['created_by'], row['created_at'], row['updated_at']
-            )
+            return user
 
 
 def delete_user(user_id: str) -> None:
@@ -314,17 +254,10 @@ def delete_user(user_id: str) -> None:
     with get_db_connection() as conn:
         with conn.cursor() as cur:
             # First delete related OTP challenges
-            cur.execute(
-                "DELETE FROM auth.otp_challenges WHERE user_id = %s",
-                (user_id,)
-            )
+            cur.execute(DELETE_USER_CHALLENGES_SQL, (user_id,))
             
             # Then delete the user
-            cur.execute(
-                "DELETE FROM auth.users WHERE id = %s RETURNING id",
-                (user_id,)
-            )
-            conn.commit()
+            cur.execute(DELETE_USER_SQL, (user_id,))
             row = cur.fetchone()
             if not row:
                 raise ValueError("User not found")
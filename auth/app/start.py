@@ -4,13 +4,28 @@ Migrations at container startup have been retired in favor of manual,
 versioned SQL under auth/migrations. Alembic has been removed.
 """
 from __future__ import annotations
-import sys
+
 
 def main() -> None:
     # Start the ASGI server
     import uvicorn
+    from . import envs
 
-    uvicorn.run("app.main:app", host="0.0.0.0", port=8000)
+    # uvloop + httptools come with uvicorn[standard]; pin them explicitly so
+    # we never silently fall back to the pure-Python loop/parser.
+    # WEB_CONCURRENCY defaults to 1: OAuth state is kept in process memory,
+    # so the callback must land on the worker that issued the authorize URL.
+    uvicorn.run(
+        "app.main:app",
+        host="0.0.0.0",
+        port=8000,
+        loop="uvloop",
+        http="httptools",
+        lifespan="on",
+        workers=envs.WEB_CONCURRENCY,
+        access_log=envs.ACCESS_LOG,
+        log_level=envs.LOG_LEVEL,
+    )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,32 @@
+-- Migration: Keyset index for schema registry history
+-- Version: 0.2.3 -> 0.2.4
+-- Description: Composite index backing cursor pagination in GET /auth/versions
+-- Author: AI Workflow Automation Team
+-- Date: 2026-10-15
+
+-- ============================================================
+-- Keyset Index
+-- ============================================================
+-- /auth/versions pages with WHERE (applied_at, id) < (cursor) ORDER BY
+-- applied_at DESC, id DESC; this index turns each page into a range scan.
+
+CREATE INDEX IF NOT EXISTS idx_schema_registry_history_service_applied_id
+ON auth.schema_registry_history (service, applied_at DESC, id DESC);
+
+-- ============================================================
+-- Migration History & Schema Registry
+-- ============================================================
+-- Registry/history are only bumped the first time this file is applied
+-- (migrations re-run on every service start).
+UPDATE auth.schema_registry 
+SET semver = '0.2.4', ts_key = extract(epoch from now()), applied_at = now()
+WHERE service = 'auth'
+  AND NOT EXISTS (SELECT 1 FROM auth.migration_history WHERE schema_name = 'auth' AND file_seq = 12);
+
+INSERT INTO auth.schema_registry_history (service, semver, ts_key, applied_at)
+SELECT 'auth', '0.2.4', extract(epoch from now()), now()
+WHERE NOT EXISTS (SELECT 1 FROM auth.migration_history WHERE schema_name = 'auth' AND file_seq = 12);
+
+INSERT INTO auth.migration_history (schema_name, file_seq, name, notes)
+VALUES ('auth', 12, '0012_schema_registry_history_keyset_index', 'Composite (service, applied_at DESC, id DESC) index for /auth/versions cursor pagination')
+ON CONFLICT (schema_name, file_seq) DO NOTHING;
@@ -0,0 +1,35 @@
+-- Migration: Ordering index for credentials list
+-- Version: 0.2.4 -> 0.2.5
+-- Description: created_at DESC index backing GET /auth/credentials/
+-- Author: AI Workflow Automation Team
+-- Date: 2026-10-15
+
+-- ============================================================
+-- Ordering Index
+-- ============================================================
+-- list_credentials reads ORDER BY created_at DESC; this index returns rows
+-- already in that order instead of sorting the table on every call.
+-- The list selects nearly every column, so an INCLUDE list could not make
+-- it an index-only scan and is left out. created_by is already indexed
+-- (idx_credentials_created_by, 0008).
+
+CREATE INDEX IF NOT EXISTS idx_credentials_created_at_desc
+ON auth.credentials (created_at DESC);
+
+-- ============================================================
+-- Migration History & Schema Registry
+-- ============================================================
+-- Registry/history are only bumped the first time this file is applied
+-- (migrations re-run on every service start).
+UPDATE auth.schema_registry 
+SET semver = '0.2.5', ts_key = extract(epoch from now()), applied_at = now()
+WHERE service = 'auth'
+  AND NOT EXISTS (SELECT 1 FROM auth.migration_history WHERE schema_name = 'auth' AND file_seq = 13);
+
+INSERT INTO auth.schema_registry_history (service, semver, ts_key, applied_at)
+SELECT 'auth', '0.2.5', extract(epoch from now()), now()
+WHERE NOT EXISTS (SELECT 1 FROM auth.migration_history WHERE schema_name = 'auth' AND file_seq = 13);
+
+INSERT INTO auth.migration_history (schema_name, file_seq, name, notes)
+VALUES ('auth', 13, '0013_credentials_created_at_index', 'created_at DESC index for the credentials list ordering')
+ON CONFLICT (schema_name, file_seq) DO NOTHING;
@@ -0,0 +1,48 @@
+-- Migration: Partial indexes for connected-credential lookups
+-- Version: 0.2.5 -> 0.2.6
+-- Description: Index connected_email / external_account_id only for connected credentials
+-- Author: AI Workflow Automation Team
+-- Date: 2026-10-15
+
+-- ============================================================
+-- Partial Lookup Indexes
+-- ============================================================
+-- POST /auth/oauth/internal/credential-token resolves a credential by id,
+-- name, connected_email or external_account_id, always with
+-- status = 'connected'. id and name are already covered by the primary key
+-- and the UNIQUE(name) index; the other two get partial indexes limited to
+-- connected rows, which keeps them small and lets the OR lookup use a
+-- BitmapOr over all four indexes instead of a sequential scan.
+
+CREATE INDEX IF NOT EXISTS idx_credentials_connected_email
+ON auth.credentials (connected_email) WHERE status = 'connected';
+
+CREATE INDEX IF NOT EXISTS idx_credentials_connected_external_id
+ON auth.credentials (external_account_id) WHERE status = 'connected';
+
+-- The full-table versions from 0008 are no longer used by any query
+DROP INDEX IF EXISTS auth.idx_credentials_email;
+DROP INDEX IF EXISTS auth.idx_credentials_external_id;
+
+-- credential_tokens.credential_id is already indexed by its UNIQUE
+-- constraint (credential_tokens_credential_unique); the extra plain index
+-- from 0008 only adds write cost
+DROP INDEX IF EXISTS auth.idx_credential_tokens_credential_id;
+
+-- ============================================================
+-- Migration History & Schema Registry
+-- ============================================================
+-- Registry/history are only bumped the first time this file is applied
+-- (migrations re-run on every service start).
+UPDATE auth.schema_registry 
+SET semver = '0.2.6', ts_key = extract(epoch from now()), applied_at = now()
+WHERE service = 'auth'
+  AND NOT EXISTS (SELECT 1 FROM auth.migration_history WHERE schema_name = 'auth' AND file_seq = 14);
+
+INSERT INTO auth.schema_registry_history (service, semver, ts_key, applied_at)
+SELECT 'auth', '0.2.6', extract(epoch from now()), now()
+WHERE NOT EXISTS (SELECT 1 FROM auth.migration_history WHERE schema_name = 'auth' AND file_seq = 14);
+
+INSERT INTO auth.migration_history (schema_name, file_seq, name, notes)
+VALUES ('auth', 14, '0014_credentials_connected_lookup_indexes', 'Partial connected_email/external_account_id indexes for internal token lookups; drop redundant indexes')
+ON CONFLICT (schema_name, file_seq) DO NOTHING;
@@ -0,0 +1,38 @@
+-- Migration: Partial expiry index for pending OTP challenges
+-- Version: 0.2.6 -> 0.2.7
+-- Description: Index expires_at of 'sent' OTP challenges for cleanup_expired_otps
+-- Author: AI Workflow Automation Team
+-- Date: 2026-10-15
+
+-- ============================================================
+-- Pending Challenge Expiry Index
+-- ============================================================
+-- cleanup_expired_otps marks rows WHERE status = 'sent' AND expires_at < NOW().
+-- Only a handful of challenges are ever pending, while approved, expired and
+-- canceled rows accumulate forever, so a partial index stays tiny and turns
+-- the sweep into a short range scan instead of a full table scan.
+--
+-- The per-user active-challenge lookup in validate_otp / store_otp needs no
+-- new index: otp_one_active_per_user (0001) is already a unique partial index
+-- on (user_id) WHERE status = 'sent'.
+
+CREATE INDEX IF NOT EXISTS idx_otp_challenges_sent_expires
+ON auth.otp_challenges (expires_at) WHERE status = 'sent';
+
+-- ============================================================
+-- Migration History & Schema Registry
+-- ============================================================
+-- Registry/history are only bumped the first time this file is applied
+-- (migrations re-run on every service start).
+UPDATE auth.schema_registry 
+SET semver = '0.2.7', ts_key = extract(epoch from now()), applied_at = now()
+WHERE service = 'auth'
+  AND NOT EXISTS (SELECT 1 FROM auth.migration_history WHERE schema_name = 'auth' AND file_seq = 15);
+
+INSERT INTO auth.schema_registry_history (service, semver, ts_key, applied_at)
+SELECT 'auth', '0.2.7', extract(epoch from now()), now()
+WHERE NOT EXISTS (SELECT 1 FROM auth.migration_history WHERE schema_name = 'auth' AND file_seq = 15);
+
+INSERT INTO auth.migration_history (schema_name, file_seq, name, notes)
+VALUES ('auth', 15, '0015_otp_challenges_expiry_index', 'Partial expires_at index on sent OTP challenges for the expiry sweep')
+ON CONFLICT (schema_name, file_seq) DO NOTHING;
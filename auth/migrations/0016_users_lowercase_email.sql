@@ -0,0 +1,58 @@
+-- Migration: Store emails lowercased and index them by plain equality
+-- Version: 0.2.7 -> 0.2.8
+-- Description: Backfill lowercase emails, add a lowercase CHECK, swap the lower(email) index for a plain unique index
+-- Author: AI Workflow Automation Team
+-- Date: 2026-10-15
+
+-- ============================================================
+-- Lowercase Email Storage
+-- ============================================================
+-- create_user and the bulk COPY loader already write email.lower(), so the
+-- column only needs lower() because older rows might be mixed case. Backfill
+-- them once and pin the invariant with a CHECK; lookups can then compare
+-- email = %s directly and use an ordinary btree index.
+--
+-- The backfill cannot collide: users_email_unique (0004) already enforces
+-- uniqueness on lower(email).
+
+UPDATE auth.users SET email = lower(email) WHERE email <> lower(email);
+
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_constraint
+        WHERE conname = 'users_email_lowercase'
+          AND conrelid = 'auth.users'::regclass
+    ) THEN
+        ALTER TABLE auth.users
+            ADD CONSTRAINT users_email_lowercase CHECK (email = lower(email));
+    END IF;
+END $$;
+
+-- ============================================================
+-- Email Index
+-- ============================================================
+-- With the CHECK in place, uniqueness on email equals uniqueness on
+-- lower(email), so the expression index from 0004 is redundant.
+
+CREATE UNIQUE INDEX IF NOT EXISTS users_email_key ON auth.users (email);
+
+DROP INDEX IF EXISTS auth.users_email_unique;
+
+-- ============================================================
+-- Migration History & Schema Registry
+-- ============================================================
+-- Registry/history are only bumped the first time this file is applied
+-- (migrations re-run on every service start).
+UPDATE auth.schema_registry 
+SET semver = '0.2.8', ts_key = extract(epoch from now()), applied_at = now()
+WHERE service = 'auth'
+  AND NOT EXISTS (SELECT 1 FROM auth.migration_history WHERE schema_name = 'auth' AND file_seq = 16);
+
+INSERT INTO auth.schema_registry_history (service, semver, ts_key, applied_at)
+SELECT 'auth', '0.2.8', extract(epoch from now()), now()
+WHERE NOT EXISTS (SELECT 1 FROM auth.migration_history WHERE schema_name = 'auth' AND file_seq = 16);
+
+INSERT INTO auth.migration_history (schema_name, file_seq, name, notes)
+VALUES ('auth', 16, '0016_users_lowercase_email', 'Lowercase email backfill + CHECK; plain unique index on email replaces lower(email) index')
+ON CONFLICT (schema_name, file_seq) DO NOTHING;